@@ -5,11 +5,28 @@ from functools import lru_cache
 class Settings(BaseSettings):
     # Existing Config
     DATABASE_URL: str = Field(...)
+    ASYNC_DATABASE_URL: str | None = Field(default=None)  # derived from DATABASE_URL if unset
+    # Comma-separated read replicas for read-only routes; empty reads from the primary
+    DATABASE_REPLICA_URLS: str = Field(default="")
+    # After a user changes, read them from the primary for this long
+    DATABASE_REPLICA_LAG_SECONDS: float = Field(default=5.0)
     SECRET_KEY: str = Field(...)
-    ALGORITHM: str = Field(default="HS256")
+    ALGORITHM: str = Field(default="HS256")  # HS256, RS256 or ES256
     ACCESS_TOKEN_EXPIRE_MINUTES: int = Field(default=15)
     REFRESH_TOKEN_EXPIRE_DAYS: int = Field(default=7)
 
+    # Asymmetric signing keys (used when ALGORITHM is RS256/ES256)
+    JWT_KEYS_DIR: str = Field(default="keys")
+    # Newest keys always kept; older ones stay until REFRESH_TOKEN_EXPIRE_DAYS after they retire
+    JWT_KEYRING_SIZE: int = Field(default=2)
+    JWT_KEYRING_RELOAD_SECONDS: int = Field(default=30)
+    JWT_RSA_KEY_SIZE: int = Field(default=2048)
+    JWKS_CACHE_MAX_AGE: int = Field(default=300)
+
+    # Batch token introspection for gateways
+    INTROSPECT_MAX_TOKENS: int = Field(default=100)
+    INTROSPECTION_SECRET: str | None = Field(default=None)  # X-Introspection-Secret header; unset = admins only
+
     # New Email Config
     MAIL_USERNAME: str = Field(...)
     MAIL_PASSWORD: str = Field(...)
@@ -21,6 +38,95 @@ class Settings(BaseSettings):
     MAIL_SSL_TLS: bool = Field(default=False)
     USE_CREDENTIALS: bool = Field(default=True)
 
+    # Email outbox worker
+    OUTBOX_POLL_SECONDS: float = Field(default=2.0)  # 0 disables the worker
+    OUTBOX_BATCH_SIZE: int = Field(default=50)
+    OUTBOX_MAX_ATTEMPTS: int = Field(default=5)
+    OUTBOX_RETRY_BASE_SECONDS: int = Field(default=30)
+    OUTBOX_RETRY_MAX_SECONDS: int = Field(default=3600)
+    OUTBOX_LEASE_SECONDS: int = Field(default=120)
+    OUTBOX_RETENTION_HOURS: int = Field(default=168)  # then sent/failed rows are deleted
+
+    # Connection pool
+    DB_POOL_SIZE: int = Field(default=5)
+    DB_MAX_OVERFLOW: int = Field(default=10)
+    DB_POOL_TIMEOUT: int = Field(default=30)
+    DB_POOL_RECYCLE: int = Field(default=1800)
+    DB_POOL_PRE_PING: bool = Field(default=True)
+    DB_STATEMENT_TIMEOUT_MS: int = Field(default=0)  # PostgreSQL only, 0 disables
+
+    # Observability
+    METRICS_ENABLED: bool = Field(default=True)
+    # Bearer token the scraper must send; unset means loopback clients only
+    METRICS_TOKEN: str | None = Field(default=None)
+    # Request profiling (see app/profiling.py); off means no middleware at all
+    PROFILING_ENABLED: bool = Field(default=False)
+    PROFILING_SAMPLE_RATE: float = Field(default=0.0)  # fraction of requests profiled
+    PROFILING_INTERVAL_MS: float = Field(default=2.0)
+    PROFILING_DIR: str = Field(default="profiles")
+    PROFILING_MAX_FILES: int = Field(default=200)  # oldest profiles are deleted beyond this
+
+    # Revocation cache
+    REVOCATION_BLOOM_CAPACITY: int = Field(default=100_000)
+    REVOCATION_BLOOM_ERROR_RATE: float = Field(default=0.001)
+    REVOCATION_CACHE_PURGE_SECONDS: int = Field(default=300)
+    REVOKED_PURGE_INTERVAL_SECONDS: int = Field(default=600)  # 0 disables the sweeper
+    REVOKED_PURGE_BATCH_SIZE: int = Field(default=1000)
+
+    # Trust verified access-token claims (uid, sub, role) instead of loading
+    # the user. Saves a lookup per request, but role changes and logout-all
+    # only take effect once the token expires (logout still works at once).
+    STATELESS_CLAIMS: bool = Field(default=False)
+
+    # User cache (get_current_user / refresh)
+    USER_CACHE_MAX_SIZE: int = Field(default=10_000)
+    USER_CACHE_TTL_SECONDS: int = Field(default=60)
+
+    # Verified access-token claims (skips JWT signature checks on repeat use; 0 disables)
+    CLAIMS_CACHE_MAX_SIZE: int = Field(default=10_000)
+
+    # Password hashing cost. The first scheme hashes new passwords; the rest
+    # are verified and migrated on login (e.g. "argon2,bcrypt", needs argon2-cffi)
+    PASSWORD_HASH_SCHEMES: str = Field(default="bcrypt")
+    BCRYPT_ROUNDS: int | None = Field(default=None)  # passlib default (12) if unset
+    BCRYPT_MIN_ROUNDS: int = Field(default=10)  # calibration never goes below this
+    ARGON2_TIME_COST: int = Field(default=3)
+    ARGON2_MEMORY_COST: int = Field(default=65536)  # KiB
+    PASSWORD_HASH_TARGET_MS: int | None = Field(default=None)  # calibrate at startup if set
+
+    # Password hashing executor ("thread" or "process")
+    HASH_EXECUTOR: str = Field(default="thread")
+    HASH_EXECUTOR_WORKERS: int = Field(default=4)
+    HASH_MAX_QUEUE: int = Field(default=32)  # waiting jobs before 503
+    HASH_RETRY_AFTER_SECONDS: int = Field(default=2)
+
+    # Reject passwords found in a local breach corpus (built with
+    # build_breached_passwords.py); unset disables the check
+    BREACHED_PASSWORDS_PATH: str | None = Field(default=None)
+
+    # Cross-worker cache invalidation: "memory" (one process), "postgres"
+    # (LISTEN/NOTIFY on DATABASE_URL) or "redis"
+    INVALIDATION_BACKEND: str = Field(default="memory")
+    INVALIDATION_CHANNEL: str = Field(default="auth_invalidation")
+    INVALIDATION_REDIS_URL: str | None = Field(default=None)  # defaults to RATE_LIMIT_REDIS_URL
+
+    # Audit trail: buffered in memory, flushed in batches by a background task.
+    # Sink is "database" (audit_events table), "file" (JSONL) or "none"
+    AUDIT_SINK: str = Field(default="database")
+    AUDIT_FILE_PATH: str = Field(default="audit.jsonl")
+    AUDIT_BUFFER_SIZE: int = Field(default=10_000)
+    AUDIT_DROP_POLICY: str = Field(default="oldest")  # or "newest" when full
+    AUDIT_FLUSH_SECONDS: float = Field(default=1.0)  # 0 flushes only at shutdown
+    AUDIT_BATCH_SIZE: int = Field(default=500)
+
+    # Login throttling (token buckets, refilled per minute)
+    RATE_LIMIT_BACKEND: str = Field(default="memory")  # "memory" or "redis"
+    RATE_LIMIT_REDIS_URL: str | None = Field(default=None)
+    LOGIN_IP_PER_MINUTE: int = Field(default=30)
+    LOGIN_IP_BURST: int = Field(default=30)
+    LOGIN_EMAIL_PER_MINUTE: int = Field(default=10)
+    LOGIN_EMAIL_BURST: int = Field(default=10)
+
     model_config = SettingsConfigDict(env_file=".env")
 
 @lru_cache()
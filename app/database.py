@@ -1,19 +1,326 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
-from app.config import DATABASE_URL
-
-# If you are using PostgreSQL, you don't need 'connect_args'.
-# The check below ensures it doesn't break if you switch back to SQLite.
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        DATABASE_URL, 
-        connect_args={"check_same_thread": False}
-    )
-else:
-    # For PostgreSQL (and MySQL, etc.)
-    engine = create_engine(DATABASE_URL)
-
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+import itertools
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import create_engine, delete, inspect, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from app.config import DATABASE_URL, settings
+
+
+# -----------------------------
+# Pool checkout-wait metrics
+# -----------------------------
+class PoolWaitStats:
+    """How long requests waited to get a connection out of the pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.checkouts = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+
+    def record(self, elapsed: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += elapsed
+            self.max_wait = max(self.max_wait, elapsed)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "wait_seconds_total": round(self.total_wait, 6),
+                "wait_seconds_max": round(self.max_wait, 6),
+                "wait_seconds_avg": round(self.total_wait / self.checkouts, 6) if self.checkouts else 0.0,
+            }
+
+
+pool_wait_stats = PoolWaitStats()
+
+
+# SQLAlchemy has no "before checkout" event, so time the pool's own getter
+class TimedQueuePool(QueuePool):
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait_stats.record(time.perf_counter() - started)
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait_stats.record(time.perf_counter() - started)
+
+
+def _engine_kwargs(url: str, is_async: bool = False) -> dict:
+    if url.startswith("sqlite") and ":memory:" in url:
+        # In-memory SQLite has a single connection; pool settings don't apply
+        return {} if is_async else {"connect_args": {"check_same_thread": False}}
+
+    kwargs = {
+        "poolclass": TimedAsyncQueuePool if is_async else TimedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+    # If you are using PostgreSQL, you don't need 'check_same_thread'.
+    # The check below ensures it doesn't break if you switch back to SQLite.
+    if url.startswith("sqlite"):
+        if not is_async:
+            kwargs["connect_args"] = {"check_same_thread": False}
+    elif settings.DB_STATEMENT_TIMEOUT_MS and url.startswith("postgresql"):
+        timeout = str(settings.DB_STATEMENT_TIMEOUT_MS)
+        if is_async:
+            kwargs["connect_args"] = {"server_settings": {"statement_timeout": timeout}}
+        else:
+            kwargs["connect_args"] = {"options": f"-c statement_timeout={timeout}"}
+    return kwargs
+
+
+# The engine and sessionmaker are built on first use rather than at import,
+# which keeps worker cold start (and CLI scripts that never connect) cheap.
+# `engine` and `SessionLocal` stay importable through __getattr__ below.
+_engine = None
+_sessionmaker = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(DATABASE_URL, **_engine_kwargs(DATABASE_URL))
+    return _engine
+
+
+def get_sessionmaker() -> sessionmaker:
+    global _sessionmaker
+    if _sessionmaker is None:
+        bind = get_engine()
+        with _engine_lock:
+            if _sessionmaker is None:
+                _sessionmaker = sessionmaker(bind=bind, autoflush=False, autocommit=False)
+    return _sessionmaker
+
+
+def __getattr__(name: str):
+    if name == "engine":
+        return get_engine()
+    if name == "SessionLocal":
+        return get_sessionmaker()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 class Base(DeclarativeBase):
-    pass
\ No newline at end of file
+    pass
+
+
+# -----------------------------
+# Schema check
+# -----------------------------
+def _missing_columns(bind) -> list[str]:
+    inspector = inspect(bind)
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        missing.extend(f"{table.name}.{c.name}" for c in table.columns if c.name not in existing)
+    return missing
+
+
+def _rebuild_legacy_revoked_tokens(bind) -> None:
+    """
+    revoked_tokens once stored the raw token in a NOT NULL `token` column,
+    which create_all can't drop, so every new revocation would fail. The
+    table only holds revocations of short-lived tokens: rebuild it, keeping
+    the still-unexpired ones as hashes.
+    """
+    from jose import JWTError, jwt
+    from app import models
+    from app.security import hash_token
+
+    inspector = inspect(bind)
+    if not inspector.has_table("revoked_tokens"):
+        return
+    columns = {column["name"] for column in inspector.get_columns("revoked_tokens")}
+    if "token" not in columns or "token_hash" in columns:
+        return
+
+    now = time.time()
+    with bind.begin() as conn:
+        tokens = conn.execute(text("SELECT token FROM revoked_tokens")).scalars().all()
+        conn.execute(text("DROP TABLE revoked_tokens"))
+        models.RevokedToken.__table__.create(conn)
+        rows = {}
+        for token in tokens:
+            try:
+                exp = jwt.get_unverified_claims(token).get("exp")
+            except JWTError:
+                continue
+            if isinstance(exp, (int, float)) and exp > now:
+                rows[hash_token(token)] = datetime.fromtimestamp(exp, timezone.utc).replace(tzinfo=None)
+        if rows:
+            conn.execute(models.RevokedToken.__table__.insert(), [
+                {"token_hash": token_hash, "expires_at": expires_at}
+                for token_hash, expires_at in rows.items()
+            ])
+
+
+def ensure_schema(bind=None) -> bool:
+    """
+    Make sure the database matches the models, cheaply on the common path.
+
+    A single SELECT of schema_version decides it: if it matches
+    models.SCHEMA_VERSION nothing else runs. Otherwise (new database, or the
+    models changed) missing tables are created and every column is checked;
+    columns that create_all can't add raise with their names, rather than
+    failing later mid-request. The one incompatible legacy table,
+    revoked_tokens, is rebuilt first. Returns True if the schema was (re)stamped.
+    """
+    from app import models
+
+    bind = bind if bind is not None else get_engine()
+    try:
+        with bind.connect() as conn:
+            current = conn.execute(select(models.SchemaVersion.version)).scalar()
+    except DBAPIError:
+        current = None  # no schema_version table yet
+
+    if current is not None and current >= models.SCHEMA_VERSION:
+        # Newer than this code during a rolling deploy: schema changes are additive
+        return False
+
+    _rebuild_legacy_revoked_tokens(bind)
+    Base.metadata.create_all(bind=bind)
+    missing = _missing_columns(bind)
+    if missing:
+        raise RuntimeError(
+            f"Database schema (version {current}) is behind the models "
+            f"(version {models.SCHEMA_VERSION}); add the missing columns: {', '.join(missing)}"
+        )
+    with bind.begin() as conn:
+        conn.execute(delete(models.SchemaVersion))
+        conn.execute(models.SchemaVersion.__table__.insert().values(version=models.SCHEMA_VERSION))
+    return True
+
+
+# -----------------------------
+# Read replicas
+# -----------------------------
+class ReadRouter:
+    """
+    Hands out sessions for read-only work, round-robin across the replicas.
+    With no replicas configured it falls back to the primary. Replica
+    sessions carry info["replica"] so callers can tell them apart. Like the
+    primary's, the replica engines are built on first use.
+    """
+
+    def __init__(self, urls: list[str]):
+        self.urls = urls
+        self._engines: list | None = None
+        self._sessionmakers: list[sessionmaker] | None = None
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+
+    @property
+    def has_replicas(self) -> bool:
+        return bool(self.urls)
+
+    def _replica_sessionmakers(self) -> list[sessionmaker]:
+        if self._sessionmakers is None:
+            with self._lock:
+                if self._sessionmakers is None:
+                    self._engines = [create_engine(url, **_engine_kwargs(url)) for url in self.urls]
+                    self._sessionmakers = [
+                        sessionmaker(bind=e, autoflush=False, autocommit=False, info={"replica": True})
+                        for e in self._engines
+                    ]
+        return self._sessionmakers
+
+    @property
+    def engines(self) -> list:
+        self._replica_sessionmakers()
+        return self._engines
+
+    def session(self) -> Session:
+        if not self.urls:
+            return get_sessionmaker()()
+        sessionmakers = self._replica_sessionmakers()
+        return sessionmakers[next(self._counter) % len(sessionmakers)]()
+
+
+read_router = ReadRouter(
+    [url.strip() for url in settings.DATABASE_REPLICA_URLS.split(",") if url.strip()]
+)
+
+
+# -----------------------------
+# Async engine (opt-in, created on first use)
+# -----------------------------
+def async_database_url(url: str) -> str:
+    """Map a sync driver URL onto its async driver (aiosqlite / asyncpg)."""
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    scheme, sep, rest = url.partition("://")
+    if scheme == "sqlite":
+        scheme = "sqlite+aiosqlite"
+    elif scheme in ("postgres", "postgresql", "postgresql+psycopg2"):
+        scheme = "postgresql+asyncpg"
+    return f"{scheme}{sep}{rest}"
+
+
+_async_engine = None
+_async_sessionmaker = None
+_async_lock = threading.Lock()
+
+
+def get_async_sessionmaker():
+    global _async_engine, _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        with _async_lock:
+            if _async_sessionmaker is None:
+                url = async_database_url(DATABASE_URL)
+                _async_engine = create_async_engine(url, **_engine_kwargs(url, is_async=True))
+                _async_sessionmaker = async_sessionmaker(
+                    bind=_async_engine, autoflush=False, expire_on_commit=False
+                )
+    return _async_sessionmaker
+
+
+async def dispose_async_engine() -> None:
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = _async_sessionmaker = None
+
+
+def pool_status() -> dict:
+    pool = get_engine().pool
+    status = {"pool": pool.status(), "checkout_wait": pool_wait_stats.snapshot()}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+        })
+    if read_router.has_replicas:
+        status["replicas"] = [e.pool.status() for e in read_router.engines]
+    return status
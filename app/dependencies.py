@@ -1,9 +1,50 @@
-from app.database import SessionLocal
-from typing import Generator
+from fastapi import Request
+from app import database
+from app.database import get_async_sessionmaker, get_sessionmaker
+from typing import AsyncGenerator, Generator
 
-def get_db() -> Generator:
-    db = SessionLocal()
+# Creating a Session doesn't check out a pooled connection; that happens on
+# the first statement, so requests answered from caches or claims never do
+def _primary_session(request: Request):
+    # One primary session per request, whichever dependency asks first
+    db = getattr(request.state, "primary_db", None)
+    if db is None:
+        db = request.state.primary_db = get_sessionmaker()()
+    return db
+
+def get_db(request: Request) -> Generator:
+    db = _primary_session(request)
     try:
         yield db
     finally:
         db.close()
+
+# Whether each route depends on get_db anywhere in its tree, worked out once.
+# Routes aren't hashable; keyed by id, holding the route so the id stays its own
+_route_writes: dict[int, tuple[object, bool]] = {}
+
+def _depends_on(dependant, call) -> bool:
+    return any(d.call is call or _depends_on(d, call) for d in dependant.dependencies)
+
+def _writes(request: Request) -> bool:
+    route = request.scope.get("route")
+    if route is None:
+        return False
+    if id(route) not in _route_writes:
+        _route_writes[id(route)] = (route, _depends_on(route.dependant, get_db))
+    return _route_writes[id(route)][1]
+
+# For read-only work: a replica session. A route that also writes (declares
+# get_db anywhere, in any order) reads from its primary session instead, so
+# it sees its own writes and never acts on replica-lagged rows
+def get_read_db(request: Request) -> Generator:
+    db = _primary_session(request) if _writes(request) else database.read_router.session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# For async routes: an AsyncSession on the aiosqlite/asyncpg engine
+async def get_async_db() -> AsyncGenerator:
+    async with get_async_sessionmaker()() as db:
+        yield db
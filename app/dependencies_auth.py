@@ -1,19 +1,44 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials # 1. Import HTTPBearer
-from jose import jwt, JWTError
+from jose import JWTError
 from sqlalchemy.orm import Session
 
-from app.config import SECRET_KEY, ALGORITHM
-from app.dependencies import get_db
-from app import models
+from app.config import settings
+from app.dependencies import get_read_db
+from app.security import hash_token
+from app.services.claims_cache import decode_token_cached
+from app.services.revocation import revocation_cache
+from app.services.user_cache import get_user_by_email
 
 # 2. Use HTTPBearer instead of OAuth2PasswordBearer
 security = HTTPBearer()
 
+
+class Principal:
+    """The authenticated user as described by verified claims (STATELESS_CLAIMS)."""
+
+    is_active = True
+
+    def __init__(self, id: int, email: str, role: str):
+        self.id = id
+        self.email = email
+        self.role = role
+
+
+def ensure_active(user) -> None:
+    """Deactivated accounts can't log in, nor use tokens issued before."""
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Account is disabled"
+        )
+
+
 # 3. Update get_current_user to accept credentials
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    # A replica, unless the route also writes (then the primary; see get_read_db)
+    db: Session = Depends(get_read_db)
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -23,16 +48,18 @@ def get_current_user(
 
     # 4. Extract the token string from the credentials object
     token = credentials.credentials
+    token_hash = hash_token(token)
 
-    # Check if token is revoked
-    if db.query(models.RevokedToken).filter(models.RevokedToken.token == token).first():
+    # Check if token is revoked (answered in-process unless the Bloom filter hits)
+    if revocation_cache.is_revoked(db, token_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token has been revoked"
         )
 
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        # Signature is verified on first sight, then served from the claims cache
+        payload = decode_token_cached(token, token_hash)
         # Remember our previous fix: use email here if you followed Option A, or user_id for Option B
         email: str | None = payload.get("sub") 
         
@@ -41,12 +68,24 @@ def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    # Ensure this query matches your 'sub' claim (email vs id)
-    user = db.query(models.User).filter(models.User.email == email).first()
+    # Stateless mode: answer from the token alone (older tokens lack "uid")
+    if settings.STATELESS_CLAIMS and payload.get("uid") is not None and payload.get("role"):
+        return Principal(id=payload["uid"], email=email, role=payload["role"])
+
+    # Ensure this lookup matches your 'sub' claim (email vs id)
+    user = get_user_by_email(db, email)
     
     if user is None:
         raise credentials_exception
 
+    # Tokens minted before the user's last "log out everywhere" are dead
+    if payload.get("ver", 0) != user.token_version:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked"
+        )
+
+    ensure_active(user)
     return user
 
 
@@ -0,0 +1,220 @@
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import jwk, jwt, JWTError
+
+from app.config import settings
+
+_KID_TIME_FORMAT = "%Y%m%dT%H%M%S%f"
+
+
+def _activation(kid: str) -> float:
+    # Key ids start with the UTC time the key starts signing
+    started = datetime.strptime(kid.split("-", 1)[0], _KID_TIME_FORMAT)
+    return started.replace(tzinfo=timezone.utc).timestamp()
+
+
+class SigningKey:
+    def __init__(self, kid: str, private_pem: str):
+        self.kid = kid
+        self.private_pem = private_pem
+        self.activates_at = _activation(kid)
+        private_key = serialization.load_pem_private_key(private_pem.encode(), password=None)
+        self.public_pem = private_key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo,
+        ).decode()
+
+
+class KeyRing:
+    """
+    Asymmetric JWT signing keys stored as ``<kid>.pem`` files in one directory.
+
+    Key ids start with the UTC time the key starts signing, so they sort in
+    activation order and the newest already-active key signs. A rotated-in
+    key is published in the JWKS before it activates, and a retired key is
+    kept until every token it signed has expired, so verifiers with a cached
+    JWKS never see a token they can't check. Every worker reloads the
+    directory when it changes, so a rotation done by the CLI (or another
+    worker) is picked up without a restart.
+    """
+
+    def __init__(self, keys_dir: str, algorithm: str, size: int = 2, reload_seconds: float = 30):
+        if algorithm not in ("RS256", "ES256"):
+            raise ValueError(f"Unsupported asymmetric algorithm: {algorithm}")
+        self.keys_dir = Path(keys_dir)
+        self.algorithm = algorithm
+        self.size = max(size, 1)
+        self.reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+        self._keys: dict[str, SigningKey] = {}
+        self._jwks: dict | None = None
+        self._mtime: float | None = None
+        self._next_check = 0.0
+
+    # -----------------------------
+    # Key management
+    # -----------------------------
+    def _generate_pem(self) -> str:
+        if self.algorithm == "RS256":
+            key = rsa.generate_private_key(
+                public_exponent=65537, key_size=settings.JWT_RSA_KEY_SIZE
+            )
+        else:
+            key = ec.generate_private_key(ec.SECP256R1())
+        return key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        ).decode()
+
+    def _write_new_key(self, activates_at: float) -> str:
+        self.keys_dir.mkdir(parents=True, exist_ok=True)
+        activation = datetime.fromtimestamp(activates_at, timezone.utc)
+        kid = f"{activation:{_KID_TIME_FORMAT}}-{uuid.uuid4().hex[:8]}"
+        tmp = self.keys_dir / f"{kid}.pem.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(self._generate_pem())
+        # Renamed into place so other workers never read a half-written key
+        os.replace(tmp, self.keys_dir / f"{kid}.pem")
+        return kid
+
+    def rotate(self, activate_in: float | None = None) -> str:
+        """
+        Add a key that starts signing in activate_in seconds, then prune.
+
+        Until then it is only published. The default outlasts a JWKS cached
+        just before any worker reloaded, so every verifier has the key before
+        the first token signed with it. Pass 0 to replace a leaked key at once.
+        """
+        if activate_in is None:
+            activate_in = settings.JWKS_CACHE_MAX_AGE + self.reload_seconds
+        kid = self._write_new_key(time.time() + activate_in)
+        self._prune()
+        self.load()
+        return kid
+
+    def _prune(self) -> None:
+        # A key retires when its successor activates, and tokens it signed
+        # live up to REFRESH_TOKEN_EXPIRE_DAYS after that. The newest `size`
+        # keys are kept whatever their age.
+        retention = settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60
+        paths = sorted(self.keys_dir.glob("*.pem"))
+        now = time.time()
+        for path, successor in zip(paths[:-self.size], paths[1:]):
+            if _activation(successor.stem) + retention <= now:
+                path.unlink()
+
+    def _create_first_key(self, timeout: float = 30) -> None:
+        """
+        Generate the first key once, however many workers boot at the same time.
+
+        Whoever creates the lock file generates the key; the others wait for it
+        to appear and load it, so every worker signs with the same key.
+        """
+        lock = self.keys_dir / ".first-key.lock"
+        try:
+            os.close(os.open(lock, os.O_WRONLY | os.O_CREAT | os.O_EXCL))
+        except FileExistsError:
+            deadline = time.monotonic() + timeout
+            while not any(self.keys_dir.glob("*.pem")):
+                if time.monotonic() > deadline:
+                    raise RuntimeError(
+                        f"No signing key appeared in {self.keys_dir}; if no worker is "
+                        f"starting, remove the stale {lock.name}"
+                    )
+                time.sleep(0.05)
+        else:
+            try:
+                # Another worker may have finished between our load and the lock
+                if not any(self.keys_dir.glob("*.pem")):
+                    self._write_new_key(time.time())
+            finally:
+                lock.unlink()
+        self.load()
+
+    def load(self) -> None:
+        with self._lock:
+            self.keys_dir.mkdir(parents=True, exist_ok=True)
+            paths = sorted(self.keys_dir.glob("*.pem"))
+            self._keys = {p.stem: SigningKey(p.stem, p.read_text()) for p in paths}
+            self._jwks = None
+            self._mtime = self.keys_dir.stat().st_mtime
+            self._next_check = time.monotonic() + self.reload_seconds
+        if not self._keys:
+            self._create_first_key()
+
+    def _ensure_loaded(self, force: bool = False) -> None:
+        if not self._keys:
+            self.load()
+            return
+        if not force and time.monotonic() < self._next_check:
+            return
+        try:
+            changed = self.keys_dir.stat().st_mtime != self._mtime
+        except FileNotFoundError:
+            changed = True
+        if changed:
+            self.load()
+        else:
+            self._next_check = time.monotonic() + self.reload_seconds
+
+    # -----------------------------
+    # JWT operations
+    # -----------------------------
+    def _signing_key(self) -> SigningKey:
+        # Keys sort by activation; pending ones are published but don't sign yet
+        keys = list(self._keys.values())
+        now = time.time()
+        return next((k for k in reversed(keys) if k.activates_at <= now), keys[0])
+
+    def sign(self, claims: dict) -> str:
+        self._ensure_loaded()
+        key = self._signing_key()
+        return jwt.encode(claims, key.private_pem, algorithm=self.algorithm, headers={"kid": key.kid})
+
+    def decode(self, token: str, **kwargs) -> dict:
+        kid = jwt.get_unverified_header(token).get("kid")
+        self._ensure_loaded()
+        key = self._keys.get(kid)
+        if key is None:
+            # Possibly signed with a key rotated in by another process
+            self._ensure_loaded(force=True)
+            key = self._keys.get(kid)
+        if key is None:
+            raise JWTError("Unknown signing key")
+        return jwt.decode(token, key.public_pem, algorithms=[self.algorithm], **kwargs)
+
+    def jwks(self) -> dict:
+        self._ensure_loaded()
+        with self._lock:
+            if self._jwks is None:
+                keys = []
+                for key in self._keys.values():
+                    entry = jwk.construct(key.public_pem, self.algorithm).to_dict()
+                    entry.update({"kid": key.kid, "use": "sig"})
+                    keys.append(entry)
+                self._jwks = {"keys": keys}
+            return self._jwks
+
+
+_keyring: KeyRing | None = None
+
+
+def get_keyring() -> KeyRing:
+    global _keyring
+    if _keyring is None:
+        _keyring = KeyRing(
+            settings.JWT_KEYS_DIR,
+            settings.ALGORITHM,
+            size=settings.JWT_KEYRING_SIZE,
+            reload_seconds=settings.JWT_KEYRING_RELOAD_SECONDS,
+        )
+    return _keyring
@@ -1,14 +1,92 @@
-from fastapi import FastAPI
+import asyncio
+import hmac
+import time
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware # Import this
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, contextmanager, suppress
 
-from app.database import Base, engine
-from app.routes import auth, users
+from app import database, metrics, profiling, security
+from app.database import dispose_async_engine, ensure_schema
+from app.keyring import get_keyring
+from app.routes import auth, jwks, users
+from app.config import settings
+from app.services.audit import flush_audit, run_audit_flusher
+from app.services.breached_passwords import get_index as get_breached_index
+from app.services.invalidation import run_invalidation_listener
+from app.services.outbox import run_outbox_worker
+from app.services.revocation import revocation_cache, run_revocation_sweeper
+
+# Seconds spent in each startup phase, for benchmarks/bench_startup.py
+startup_timings: dict[str, float] = {}
+
+@contextmanager
+def _phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[name] = time.perf_counter() - started
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    Base.metadata.create_all(bind=engine)
+    # One SELECT when the schema is current; create_all only after model changes
+    with _phase("schema_check"):
+        ensure_schema()
+
+    # Match hashing cost to this machine before serving logins
+    if settings.PASSWORD_HASH_TARGET_MS:
+        with _phase("hash_calibration"):
+            await asyncio.to_thread(
+                security.calibrate_password_hashing, settings.PASSWORD_HASH_TARGET_MS
+            )
+
+    # Load outstanding revocations so "not revoked" never needs the DB
+    with _phase("revocation_warm"):
+        db = database.SessionLocal()
+        try:
+            revocation_cache.warm(db)
+        finally:
+            db.close()
+
+    # Open the breached-password index now, so a bad path fails at boot
+    with _phase("breached_index"):
+        get_breached_index()
+
+    # Load (or create on first boot) the signing keys before serving tokens
+    if security.uses_keyring():
+        with _phase("keyring"):
+            get_keyring().load()
+
+    background = []
+    # Apply other workers' logouts, role changes and resets to our caches
+    if settings.INVALIDATION_BACKEND != "memory":
+        background.append(asyncio.create_task(run_invalidation_listener()))
+    # Keep revoked_tokens bounded by deleting rows whose token has expired
+    if settings.REVOKED_PURGE_INTERVAL_SECONDS > 0:
+        background.append(asyncio.create_task(
+            run_revocation_sweeper(settings.REVOKED_PURGE_INTERVAL_SECONDS)
+        ))
+    # Deliver queued emails (password resets) outside the request path
+    if settings.OUTBOX_POLL_SECONDS > 0:
+        background.append(asyncio.create_task(
+            run_outbox_worker(settings.OUTBOX_POLL_SECONDS)
+        ))
+    # Write buffered audit events in batches, off the request path
+    if settings.AUDIT_SINK != "none" and settings.AUDIT_FLUSH_SECONDS > 0:
+        background.append(asyncio.create_task(
+            run_audit_flusher(settings.AUDIT_FLUSH_SECONDS)
+        ))
     yield
+    for task in background:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    # Whatever is still buffered goes out before the worker exits
+    if settings.AUDIT_SINK != "none":
+        await flush_audit()
+    security.shutdown_hash_executor()
+    await dispose_async_engine()
 
 app = FastAPI(
     title="Authentication Service",
@@ -31,9 +109,41 @@ app.add_middleware(
 )
 # ------------------------
 
+# Per-route latency, status and query counts for /metrics
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+# Admin-triggered or sampled request profiles
+if settings.PROFILING_ENABLED:
+    app.add_middleware(profiling.ProfilingMiddleware)
+
+@app.exception_handler(security.HashingOverloaded)
+async def hashing_overloaded_handler(request: Request, exc: security.HashingOverloaded):
+    # Shed bcrypt load instead of queueing it; token-only endpoints stay fast
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, please retry shortly"},
+        headers={"Retry-After": str(settings.HASH_RETRY_AFTER_SECONDS)},
+    )
+
 app.include_router(auth.router)
+app.include_router(jwks.router)
 app.include_router(users.router)
 
+def _metrics_scrape_allowed(request: Request) -> bool:
+    # Pool, cache and hashing internals are for the scraper, not the public
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        return hmac.compare_digest(request.headers.get("authorization", ""), expected)
+    return request.client is not None and request.client.host in ("127.0.0.1", "::1")
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def prometheus_metrics(request: Request):
+        if not _metrics_scrape_allowed(request):
+            raise HTTPException(status_code=403, detail="Metrics are not available to this client")
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def root():
     return {"message": "Auth Service is running"}
\ No newline at end of file
@@ -0,0 +1,236 @@
+"""
+Minimal Prometheus-style metrics: counters, histograms and callback gauges,
+rendered in the text exposition format served at /metrics.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.buckets = tuple(buckets)
+        self._values: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                le = _format_labels(self.labelnames, labels, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{le} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Gauge:
+    """Read at scrape time from a callback returning {label values: value}."""
+
+    def __init__(self, name: str, help: str, callback: Callable[[], dict], labelnames: tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.callback = callback
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(self.callback().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+registry: list = []
+
+
+def register(metric):
+    registry.append(metric)
+    return metric
+
+
+def render() -> str:
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# -----------------------------
+# Request and stage metrics
+# -----------------------------
+REQUESTS = register(Counter(
+    "http_requests_total", "HTTP requests by route and status.", ("method", "route", "status")
+))
+REQUEST_LATENCY = register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route")
+))
+STAGE_LATENCY = register(Histogram(
+    "auth_stage_duration_seconds",
+    "Time spent in each stage of request handling (revocation lookup, JWT decode, "
+    "user lookup, bcrypt hash/verify including executor queueing, email send).",
+    ("stage",),
+))
+QUERIES_PER_REQUEST = register(Histogram(
+    "db_queries_per_request", "SQL statements executed per request.", ("route",),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21),
+))
+
+
+def stage(name: str):
+    """Time one stage of a request: ``with metrics.stage("jwt_decode"): ...``"""
+    return STAGE_LATENCY.time(name)
+
+
+# A mutable per-request counter. Sync dependencies run on copies of the
+# request's context, so they share the list object and their increments count.
+_query_count: contextvars.ContextVar[list | None] = contextvars.ContextVar("query_count", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_count.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: per-route latency, status counts and query counts."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        counter = [0]
+        token = _query_count.set(counter)
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _query_count.reset(token)
+            route = _route_label(scope)
+            REQUEST_LATENCY.observe(time.perf_counter() - started, scope["method"], route)
+            REQUESTS.inc(scope["method"], route, status_code)
+            QUERIES_PER_REQUEST.observe(counter[0], route)
+
+
+# -----------------------------
+# Gauges read at scrape time
+# -----------------------------
+def _pool_gauges() -> dict:
+    from app.database import pool_status
+
+    status = pool_status()
+    values = {(key,): status[key] for key in ("size", "checked_out", "checked_in", "overflow") if key in status}
+    wait = status["checkout_wait"]
+    values[("checkouts_total",)] = wait["checkouts"]
+    values[("checkout_wait_seconds_total",)] = wait["wait_seconds_total"]
+    values[("checkout_wait_seconds_max",)] = wait["wait_seconds_max"]
+    return values
+
+
+def _cache_gauges() -> dict:
+    from app.services.claims_cache import claims_cache
+    from app.services.revocation import revocation_cache
+    from app.services.user_cache import user_cache
+
+    values = {("revocation", "size"): len(revocation_cache)}
+    for name, cache in (("user", user_cache), ("claims", claims_cache)):
+        stats = cache.stats()
+        for stat in ("size", "hits", "misses", "hit_rate"):
+            values[(name, stat)] = stats[stat]
+    return values
+
+
+def _hashing_gauges() -> dict:
+    from app.security import hash_admission
+
+    return {
+        ("in_flight",): hash_admission.in_flight,
+        ("limit",): hash_admission.limit,
+        ("rejected_total",): hash_admission.rejected,
+    }
+
+
+def _audit_gauges() -> dict:
+    from app.services.audit import audit_log
+
+    return {(stat,): value for stat, value in audit_log.stats().items()}
+
+
+register(Gauge("db_pool", "Primary connection pool state.", _pool_gauges, ("stat",)))
+register(Gauge("auth_cache", "In-process cache state.", _cache_gauges, ("cache", "stat")))
+register(Gauge("password_hashing", "Hashing admission gate state.", _hashing_gauges, ("stat",)))
+register(Gauge("audit_log", "Audit buffer depth, drops and flushes.", _audit_gauges, ("stat",)))
@@ -1,9 +1,18 @@
-from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import String, Boolean
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import String, Boolean, Integer, Text, ForeignKey
 from app.database import Base
 from sqlalchemy import DateTime
 from datetime import datetime
 
+# Bump whenever a table or column is added; startup compares it against the
+# schema_version row instead of running create_all on every boot
+SCHEMA_VERSION = 2
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+
+    version: Mapped[int] = mapped_column(Integer, primary_key=True)
+
 class User(Base):
     __tablename__ = "users"
 
@@ -12,10 +21,63 @@ class User(Base):
     hashed_password: Mapped[str]
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     role: Mapped[str] = mapped_column(String, default="user")
+    # Embedded in every token as "ver"; bumping it invalidates them all at once
+    token_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
 
 class RevokedToken(Base):
     __tablename__ = "revoked_tokens"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    token: Mapped[str] = mapped_column(unique=True)
+    # SHA-256 hex digest of the token, not the token itself
+    token_hash: Mapped[str] = mapped_column(String(64), unique=True)
+    # Indexed so the background sweeper can find expired rows cheaply
+    expires_at: Mapped[datetime] = mapped_column(DateTime, index=True)
     revoked_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    recipient: Mapped[str] = mapped_column(String)
+    subject: Mapped[str] = mapped_column(String)
+    body: Mapped[str] = mapped_column(Text)
+    # pending -> sent, or failed once OUTBOX_MAX_ATTEMPTS is reached
+    status: Mapped[str] = mapped_column(String(16), default="pending")
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    sent_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+class RefreshSession(Base):
+    """One row per issued refresh token, keyed by its jti claim."""
+    __tablename__ = "refresh_sessions"
+
+    jti: Mapped[str] = mapped_column(String(32), primary_key=True)
+    # Every rotation of one login shares a family; reuse revokes the family
+    family_id: Mapped[str] = mapped_column(String(32), index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Indexed for the purge; rotated rows are kept until then to detect reuse
+    expires_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    last_used_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    replaced_by: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    revoked_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    user_agent: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    ip_address: Mapped[str | None] = mapped_column(String(45), nullable=True)
+
+    # Loaded in the same query, so a refresh is one primary-key lookup
+    user: Mapped[User] = relationship(lazy="joined")
+
+class AuditEvent(Base):
+    __tablename__ = "audit_events"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    event: Mapped[str] = mapped_column(String(32), index=True)
+    # No foreign key: the trail must outlive the user row
+    user_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    email: Mapped[str | None] = mapped_column(String(255), nullable=True, index=True)
+    ip_address: Mapped[str | None] = mapped_column(String(45), nullable=True)
+    success: Mapped[bool] = mapped_column(Boolean, default=True)
+    detail: Mapped[str | None] = mapped_column(String(255), nullable=True)
@@ -0,0 +1,225 @@
+"""
+On-demand request profiling.
+
+When PROFILING_ENABLED is set, ProfilingMiddleware profiles a request if an
+admin asks for it (``X-Profile: 1`` header or ``?profile=1``, with an admin
+bearer token) or if it is picked by PROFILING_SAMPLE_RATE. A sampling thread
+records stacks while the request runs, but only of the threads working for
+it: the event loop while the request's task is the one running, and worker
+threads running a context copied from the request (the threadpool for sync
+dependencies such as get_current_user, asyncio.to_thread, the hashing
+threads). Concurrent requests and background loops are left out. Profiles are written to PROFILING_DIR
+in collapsed-stack format, readable by flamegraph.pl and speedscope, and
+the file name is returned in the X-Profile-Id response header. Only the
+newest PROFILING_MAX_FILES profiles are kept.
+
+With PROFILING_ENABLED off the middleware is not installed at all.
+"""
+import asyncio
+import contextvars
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import suppress
+from urllib.parse import parse_qs
+
+from jose import JWTError
+
+from app import database
+from app.config import settings
+from app.security import hash_token
+
+PROFILE_NAME = re.compile(r"^[\w.-]+\.collapsed$")
+
+# Leaf frames in these modules are threads parked waiting for work
+_IDLE_MODULES = ("threading.py", "selectors.py", "queue.py", "thread.py")
+
+
+class StackSampler:
+    """
+    Counts collapsed stacks of all other threads every interval seconds, or
+    of those for which include(thread_id, leaf_frame) is true.
+    """
+
+    def __init__(self, interval: float, include=None):
+        self.interval = interval
+        self.include = include
+        self.counts: Counter[str] = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> None:
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own or os.path.basename(frame.f_code.co_filename) in _IDLE_MODULES:
+                continue
+            if self.include is not None and not self.include(thread_id, frame):
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.append(names.get(thread_id, str(thread_id)))
+            self.counts[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+_profiled_request: contextvars.ContextVar["RequestThreads | None"] = contextvars.ContextVar(
+    "profiled_request", default=None
+)
+
+
+def _worker_context(frame) -> contextvars.Context | None:
+    # Worker threads hold the context they were handed in a frame local:
+    # anyio's WorkerThread.run keeps it as `context`, and a concurrent.futures
+    # work item runs Context.run (asyncio.to_thread, the hashing pool)
+    while frame is not None:
+        local = frame.f_locals
+        context = local.get("context")
+        if isinstance(context, contextvars.Context):
+            return context
+        fn = getattr(local.get("self"), "fn", None)
+        owner = getattr(getattr(fn, "func", fn), "__self__", None)
+        if isinstance(owner, contextvars.Context):
+            return owner
+        frame = frame.f_back
+    return None
+
+
+class RequestThreads:
+    """
+    StackSampler filter for one request. Create it inside the request's task
+    and set it in _profiled_request for as long as the request runs.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.task = asyncio.current_task()
+        self.loop_thread = threading.get_ident()
+
+    def __call__(self, thread_id: int, frame) -> bool:
+        if thread_id == self.loop_thread:
+            return asyncio.current_task(self.loop) is self.task
+        context = _worker_context(frame)
+        return context is not None and context.get(_profiled_request) is self
+
+
+def _is_admin_request(headers: dict[bytes, bytes]) -> bool:
+    """
+    The checks get_current_user and require_admin make: a valid, unrevoked
+    access token whose user still exists, is active, is an admin and hasn't
+    logged out everywhere since. Blocking; run it off the event loop.
+    """
+    from app.services.claims_cache import decode_token_cached
+    from app.services.revocation import revocation_cache
+    from app.services.user_cache import get_user_by_email
+
+    scheme, _, token = headers.get(b"authorization", b"").decode().partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    token_hash = hash_token(token)
+    try:
+        claims = decode_token_cached(token, token_hash)
+    except JWTError:
+        return False
+    if claims.get("type") != "access" or claims.get("role") != "admin":
+        return False
+    # Both lookups are usually answered from the in-process caches
+    db = database.read_router.session()
+    try:
+        if revocation_cache.is_revoked(db, token_hash):
+            return False
+        user = get_user_by_email(db, claims.get("sub") or "")
+        return (
+            user is not None
+            and user.is_active
+            and user.role == "admin"
+            and claims.get("ver", 0) == user.token_version
+        )
+    finally:
+        db.close()
+
+
+def _requested(scope, headers: dict[bytes, bytes]) -> bool:
+    if headers.get(b"x-profile") == b"1":
+        return True
+    query = parse_qs(scope.get("query_string", b"").decode())
+    return query.get("profile") == ["1"]
+
+
+def _profile_name(scope) -> str:
+    route = re.sub(r"[^\w-]+", "_", scope["path"]).strip("_") or "root"
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{scope['method']}-{route}-{uuid.uuid4().hex[:8]}.collapsed"
+
+
+def _write_profile(name: str, collapsed: str) -> None:
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    with open(os.path.join(settings.PROFILING_DIR, name), "w") as f:
+        f.write(collapsed)
+    # Names start with a timestamp, so sorting them puts the oldest first
+    profiles = sorted(p for p in os.listdir(settings.PROFILING_DIR) if PROFILE_NAME.match(p))
+    for old in profiles[:max(len(profiles) - settings.PROFILING_MAX_FILES, 0)]:
+        with suppress(FileNotFoundError):
+            os.remove(os.path.join(settings.PROFILING_DIR, old))
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware; one profile at a time per worker."""
+
+    def __init__(self, app):
+        self.app = app
+        self._busy = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        wanted = (
+            _requested(scope, headers) and await asyncio.to_thread(_is_admin_request, headers)
+        ) or random.random() < settings.PROFILING_SAMPLE_RATE
+        if not wanted or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        name = _profile_name(scope)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", name.encode())]
+            await send(message)
+
+        threads = RequestThreads()
+        marked = _profiled_request.set(threads)
+        sampler = StackSampler(settings.PROFILING_INTERVAL_MS / 1000, include=threads)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _profiled_request.reset(marked)
+            await asyncio.to_thread(sampler.stop)
+            self._busy.release()
+            await asyncio.to_thread(_write_profile, name, sampler.collapsed())
@@ -1,21 +1,31 @@
-import asyncio # Required for running async email in sync route
-from fastapi import APIRouter, Depends, HTTPException, status, Response, Request
-from fastapi.security import HTTPBearer
+import asyncio
+import hmac
+import time
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Response, Request
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import timedelta
 from jose import jwt, JWTError
 
 from app import models, schemas, security, config
-from app.dependencies import get_db
-from app.dependencies_auth import get_current_user
+from app.dependencies import get_async_db, get_db, get_read_db
+from app.dependencies_auth import ensure_active, get_current_user, require_admin
+from app.services.rate_limit import check_ip_rate, check_login_rate
+from app.services.revocation import revocation_cache, revoke_token
+from app.services import audit, invalidation, sessions
+from app.services.breached_passwords import is_breached_password
+from app.services.user_cache import get_users_by_email
 
 # Import the email service
-from app.services.email_service import send_reset_email
+from app.services.email_service import enqueue_reset_email
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 # Use HTTPBearer for a simple token input in Swagger
 http_bearer = HTTPBearer()
+optional_bearer = HTTPBearer(auto_error=False)
 
 # Helper to set the cookie
 def set_refresh_token_cookie(response: Response, token: str):
@@ -28,12 +38,26 @@ def set_refresh_token_cookie(response: Response, token: str):
         max_age=config.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60
     )
 
+def _client_ip(request: Request) -> str | None:
+    # Run uvicorn with --proxy-headers behind a load balancer so this is the real client
+    return request.client.host if request.client else None
+
+# register, login and reset-password are async: they await the hashing
+# executor instead of parking a threadpool thread on it for the whole hash.
+# The rate-limit check and the invalidation broadcast may talk to Redis or
+# Postgres, so those run in a worker thread rather than on the loop.
 # ---------------------------
 # REGISTER
 # ---------------------------
 @router.post("/register", response_model=schemas.UserOut)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    if db.query(models.User).filter(models.User.email == user.email).first():
+async def register(
+    request: Request,
+    user: schemas.UserCreate,
+    db: AsyncSession = Depends(get_async_db)
+):
+    await asyncio.to_thread(check_ip_rate, "register", _client_ip(request))
+
+    if await db.scalar(select(models.User).where(models.User.email == user.email)):
         raise HTTPException(
             status_code=400, 
             detail="Email already registered"
@@ -41,13 +65,15 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
 
     new_user = models.User(
         email=user.email,
-        hashed_password=security.hash_password(user.password),
+        hashed_password=await security.hash_password_async(user.password),
         role="user"
     )
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
+    await asyncio.to_thread(invalidation.user_changed, new_user.email)
+    audit.record("register", email=new_user.email, user_id=new_user.id, ip_address=_client_ip(request))
     return new_user
 
 
@@ -55,33 +81,63 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
 # LOGIN
 # ---------------------------
 @router.post("/login", response_model=schemas.Token)
-def login(
+async def login(
+    request: Request,
     response: Response,
     form_data: schemas.UserLogin, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(models.User).filter(
+    # Throttle before touching bcrypt
+    await asyncio.to_thread(check_login_rate, _client_ip(request), form_data.email)
+
+    user = await db.scalar(select(models.User).where(
         models.User.email == form_data.email
-    ).first()
+    ))
+
+    if not user:
+        audit.record("login", email=form_data.email, ip_address=_client_ip(request),
+                     success=False, detail="unknown email")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid credentials"
+        )
 
-    if not user or not security.verify_password(
+    valid, new_hash = await security.verify_and_update_password_async(
         form_data.password, user.hashed_password
-    ):
+    )
+    if not valid:
+        audit.record("login", email=user.email, user_id=user.id, ip_address=_client_ip(request),
+                     success=False, detail="wrong password")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
         )
+    # Only after the password check, so this doesn't reveal which accounts exist
+    if not user.is_active:
+        audit.record("login", email=user.email, user_id=user.id, ip_address=_client_ip(request),
+                     success=False, detail="account disabled")
+    ensure_active(user)
+
+    # Stored hash uses an old cost or scheme: upgrade it now that we have the password
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+        await asyncio.to_thread(invalidation.user_changed, user.email)
 
     access_token = security.create_access_token(
-        data={"sub": user.email, "role": user.role}
+        data={"sub": user.email, "uid": user.id, "role": user.role, "ver": user.token_version}
     )
 
-    refresh_token = security.create_refresh_token(
-        data={"sub": user.email}
+    # One server-side session per login; the refresh token carries its jti
+    refresh_token, _ = sessions.issue_refresh_token(
+        db, user, request.headers.get("user-agent"), _client_ip(request)
     )
+    # The async sessions don't expire on commit, so nothing is reloaded after it
+    await db.commit()
 
     # Set the HttpOnly cookie
     set_refresh_token_cookie(response, refresh_token)
+    audit.record("login", email=form_data.email, user_id=user.id, ip_address=_client_ip(request))
 
     return {
         "access_token": access_token,
@@ -95,6 +151,7 @@ def login(
 @router.post("/refresh")
 def refresh_token(
     request: Request,
+    response: Response,
     db: Session = Depends(get_db)
 ):
     # Read token from cookie
@@ -104,24 +161,28 @@ def refresh_token(
         raise HTTPException(status_code=401, detail="Refresh token missing")
 
     try:
-        payload = jwt.decode(
-            refresh_token,
-            config.SECRET_KEY,
-            algorithms=[config.ALGORITHM],
-        )
-        email = payload.get("sub")
-        if not email:
+        payload = security.decode_token(refresh_token)
+        if payload.get("type") != "refresh" or not payload.get("jti"):
             raise HTTPException(status_code=401, detail="Invalid refresh token")
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid refresh token")
 
-    # Check if user still exists
-    user = db.query(models.User).filter(models.User.email == email).first()
-    if not user:
-         raise HTTPException(status_code=401, detail="User not found")
+    # Rotate: the presented token is spent and a new one replaces it
+    try:
+        user, new_refresh_token = sessions.rotate_refresh_token(
+            db, payload, request.headers.get("user-agent"), _client_ip(request)
+        )
+    except sessions.SessionError as e:
+        audit.record("refresh", email=payload.get("sub"), ip_address=_client_ip(request),
+                     success=False, detail=str(e))
+        response.delete_cookie(key="refresh_token")
+        raise HTTPException(status_code=401, detail=str(e))
+
+    set_refresh_token_cookie(response, new_refresh_token)
+    audit.record("refresh", email=user.email, user_id=user.id, ip_address=_client_ip(request))
 
     new_access_token = security.create_access_token(
-        {"sub": email, "role": user.role},
+        {"sub": user.email, "uid": user.id, "role": user.role, "ver": user.token_version},
         timedelta(minutes=config.ACCESS_TOKEN_EXPIRE_MINUTES)
     )
 
@@ -131,11 +192,131 @@ def refresh_token(
     }
 
 
+# ---------------------------
+# SESSIONS (per-device logout)
+# ---------------------------
+def _current_session_id(request: Request) -> str | None:
+    refresh_token = request.cookies.get("refresh_token")
+    if not refresh_token:
+        return None
+    try:
+        return security.decode_token(refresh_token).get("jti")
+    except JWTError:
+        return None
+
+
+@router.get("/sessions", response_model=list[schemas.SessionOut])
+def list_sessions(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    current_id = _current_session_id(request)
+    return [
+        schemas.SessionOut(
+            id=s.jti,
+            created_at=s.created_at,
+            last_used_at=s.last_used_at,
+            expires_at=s.expires_at,
+            user_agent=s.user_agent,
+            ip_address=s.ip_address,
+            current=s.jti == current_id,
+        )
+        for s in sessions.active_sessions(db, current_user.id)
+    ]
+
+
+@router.delete("/sessions/{session_id}")
+def revoke_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    session = db.get(models.RefreshSession, session_id)
+    if not session or session.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    sessions.revoke_family(db, session.family_id)
+    db.commit()
+    audit.record("session_revoked", email=current_user.email, user_id=current_user.id,
+                 detail=session_id)
+    return {"message": "Session revoked"}
+
+
+# ---------------------------
+# INTROSPECT (batch, for gateways)
+# ---------------------------
+def require_introspection_caller(
+    x_introspection_secret: str | None = Header(default=None),
+    credentials: HTTPAuthorizationCredentials | None = Depends(optional_bearer),
+    db: Session = Depends(get_read_db),
+):
+    # Gateways present the shared secret; with none configured, only admins may ask
+    secret = config.settings.INTROSPECTION_SECRET
+    if secret:
+        if not hmac.compare_digest(x_introspection_secret or "", secret):
+            raise HTTPException(status_code=401, detail="Invalid introspection secret")
+        return
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    require_admin(get_current_user(credentials, db))
+
+
+@router.post("/introspect", response_model=schemas.IntrospectResponse)
+def introspect(
+    body: schemas.IntrospectRequest,
+    db: Session = Depends(get_read_db),
+    caller=Depends(require_introspection_caller),
+):
+
+    # Decode everything first, then do one revocation and one user lookup
+    now = time.time()
+    decoded: list[dict | None] = []
+    for token in body.tokens:
+        try:
+            decoded.append(security.decode_token(token, options={"verify_exp": False}))
+        except JWTError:
+            decoded.append(None)
+
+    hashes = [security.hash_token(token) for token in body.tokens]
+    revoked = revocation_cache.revoked_among(
+        db, [h for h, claims in zip(hashes, decoded) if claims is not None]
+    )
+    users = get_users_by_email(
+        db, {claims["sub"] for claims in decoded if claims and claims.get("sub")}
+    )
+
+    results = []
+    for token_hash, claims in zip(hashes, decoded):
+        user = users.get(claims.get("sub")) if claims else None
+        # Refresh and reset tokens never authorise an API call
+        if claims is None or claims.get("type") != "access" or user is None or not user.is_active:
+            results.append(schemas.TokenIntrospection(active=False, status="invalid"))
+            continue
+
+        if token_hash in revoked or claims.get("ver", 0) != user.token_version:
+            token_status = "revoked"
+        elif claims.get("exp", 0) <= now:
+            token_status = "expired"
+        else:
+            token_status = "active"
+
+        results.append(schemas.TokenIntrospection(
+            active=token_status == "active",
+            status=token_status,
+            claims=claims,
+            role=user.role,
+        ))
+
+    return {"results": results}
+
+
 # ---------------------------
 # LOGOUT
 # ---------------------------
 @router.post("/logout")
 def logout(
+    request: Request,
     response: Response,
     credentials: HTTPBearer = Depends(http_bearer),
     db: Session = Depends(get_db),
@@ -143,17 +324,43 @@ def logout(
 ):
     # Extract token string
     token = credentials.credentials
+    # The commits below expire current_user; read it now rather than reload it
+    user_id, email = current_user.id, current_user.email
     
-    # Add to revoked list
-    db.add(models.RevokedToken(token=token))
-    db.commit()
+    # Add to revoked list (already verified by get_current_user)
+    claims = jwt.get_unverified_claims(token)
+    token_hash = security.hash_token(token)
+    revoke_token(db, token_hash, claims["exp"])
+    invalidation.token_revoked(token_hash, claims["exp"])
+
+    # End this device's refresh session too
+    refresh_token = request.cookies.get("refresh_token")
+    if refresh_token:
+        sessions.revoke_refresh_token(db, refresh_token)
 
     # Clear the cookie
     response.delete_cookie(key="refresh_token")
+    audit.record("logout", email=email, user_id=user_id, ip_address=_client_ip(request))
 
     return {"message": "Logged out successfully"}
 
 
+@router.post("/logout-all")
+def logout_all(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    # One write invalidates every access and refresh token for this user
+    sessions.revoke_all_tokens(db, current_user)
+    response.delete_cookie(key="refresh_token")
+    audit.record("logout_all", email=current_user.email, user_id=current_user.id,
+                 ip_address=_client_ip(request))
+
+    return {"message": "Logged out of all sessions"}
+
+
 # ---------------------------
 # FORGOT PASSWORD (PRODUCTION EMAIL INTEGRATION)
 # ---------------------------
@@ -170,19 +377,13 @@ def forgot_password(
 
     # Generate Token
     reset_token = security.create_password_reset_token(
-        data={"sub": user.email}
+        data={"sub": user.email, "ver": user.token_version}
     )
 
-    # SEND EMAIL PRODUCTION
-    # FastAPI routes are synchronous by default. We run the async email function 
-    # in the event loop. This sends the email without blocking the API response.
-    try:
-        asyncio.run(send_reset_email(user.email, reset_token))
-        print(f"✅ Email dispatched to {user.email}")
-    except Exception as e:
-        # Log error but don't crash API
-        print(f"❌ Failed to send email: {e}")
-        # In prod, you might use Sentry here.
+    # Queue the email in the outbox. The outbox worker delivers it in the
+    # background (with retries), so this request never waits on SMTP.
+    enqueue_reset_email(db, user.email, reset_token)
+    audit.record("reset_requested", email=user.email, user_id=user.id)
 
     return {"message": "If that email exists, a reset link has been sent."}
 
@@ -191,16 +392,15 @@ def forgot_password(
 # RESET PASSWORD
 # ---------------------------
 @router.post("/reset-password")
-def reset_password(
+async def reset_password(
+    request: Request,
     body: schemas.ResetPasswordRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
+    await asyncio.to_thread(check_ip_rate, "reset", _client_ip(request))
+
     try:
-        payload = jwt.decode(
-            body.token,
-            config.SECRET_KEY,
-            algorithms=[config.ALGORITHM]
-        )
+        payload = security.decode_token(body.token)
         
         token_type = payload.get("type")
         if token_type != "reset":
@@ -216,12 +416,23 @@ def reset_password(
     # Basic Validation
     if len(body.new_password) < 8:
         raise HTTPException(status_code=400, detail="Password too short")
+    if is_breached_password(body.new_password):
+        raise HTTPException(status_code=400, detail=schemas.BREACHED_PASSWORD_MESSAGE)
 
-    user = db.query(models.User).filter(models.User.email == email).first()
+    user = await db.scalar(select(models.User).where(models.User.email == email))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    user.hashed_password = security.hash_password(body.new_password)
-    db.commit()
+    # A completed reset bumps the version, so each reset link works only once
+    if payload.get("ver", 0) != user.token_version:
+        audit.record("password_reset", email=user.email, user_id=user.id,
+                     ip_address=_client_ip(request), success=False, detail="stale reset token")
+        raise HTTPException(status_code=400, detail="Invalid or expired token")
+
+    user.hashed_password = await security.hash_password_async(body.new_password)
+    await db.commit()
+    # Whoever held the old password may still hold tokens: end them all
+    await sessions.revoke_all_tokens_async(db, user)
+    audit.record("password_reset", email=user.email, user_id=user.id, ip_address=_client_ip(request))
 
     return {"message": "Password reset successfully. You can now log in."}
\ No newline at end of file
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Response
+
+from app.config import settings
+from app.keyring import get_keyring
+from app.security import uses_keyring
+
+router = APIRouter(tags=["Keys"])
+
+# ---------------------------
+# JWKS (public signing keys)
+# ---------------------------
+@router.get("/.well-known/jwks.json")
+def jwks(response: Response):
+    # Downstream services cache this and verify tokens locally.
+    # The keyring itself memoises the JWKS document until the keys change.
+    response.headers["Cache-Control"] = f"public, max-age={settings.JWKS_CACHE_MAX_AGE}"
+    if not uses_keyring():
+        # HS256 tokens can't be verified with a public key
+        return {"keys": []}
+    return get_keyring().jwks()
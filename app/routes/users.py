@@ -1,12 +1,64 @@
-from fastapi import APIRouter, Depends, HTTPException
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from app.dependencies_auth import get_current_user, require_admin
-from app.dependencies import get_db
+from app.dependencies import get_db, get_read_db
 from app import models
-from app.schemas import UserOut
+from app.profiling import PROFILE_NAME
+from app.schemas import UserOut, UserPage
+from app.config import settings
+from app.database import pool_status
+from app.services.revocation import purge_expired_revocations, revocation_table_stats
+from app.services.sessions import purge_expired_sessions, revoke_all_tokens
+from app.services import audit
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
+def _filtered_users(role: str | None, is_active: bool | None):
+    stmt = select(models.User).order_by(models.User.id)
+    if role is not None:
+        stmt = stmt.where(models.User.role == role)
+    if is_active is not None:
+        stmt = stmt.where(models.User.is_active == is_active)
+    return stmt
+
+# --- ADMIN USER LISTING (keyset pagination, no OFFSET) ---
+@router.get("", response_model=UserPage)
+def list_users(
+    after_id: int | None = None,
+    limit: int = Query(default=50, ge=1, le=500),
+    role: str | None = None,
+    is_active: bool | None = None,
+    db: Session = Depends(get_read_db),
+    admin=Depends(require_admin)
+):
+    stmt = _filtered_users(role, is_active)
+    if after_id is not None:
+        stmt = stmt.where(models.User.id > after_id)
+
+    # Fetch one extra row to know whether another page exists
+    users = db.scalars(stmt.limit(limit + 1)).all()
+    next_cursor = users[limit - 1].id if len(users) > limit else None
+    return {"items": users[:limit], "next_cursor": next_cursor}
+
+# --- ADMIN USER EXPORT (streams NDJSON from a server-side cursor) ---
+@router.get("/export")
+def export_users(
+    role: str | None = None,
+    is_active: bool | None = None,
+    db: Session = Depends(get_read_db),
+    admin=Depends(require_admin)
+):
+    stmt = _filtered_users(role, is_active).execution_options(yield_per=1000)
+
+    def rows():
+        for user in db.scalars(stmt):
+            yield UserOut.model_validate(user).model_dump_json() + "\n"
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
 @router.get("/me", response_model=UserOut)
 def read_current_user(current_user=Depends(get_current_user)):
     return current_user
@@ -25,10 +77,65 @@ def promote_user_to_admin(
         raise HTTPException(status_code=404, detail="User not found")
     
     user.role = "admin"
-    db.commit()
+    # Tokens carry the role claim: end the ones issued under the old role
+    # (committed together with the role change)
+    revoke_all_tokens(db, user)
+    audit.record("promote", email=user.email, user_id=user.id, detail=f"by {current_admin.email}")
     
     return {"message": f"User {user.email} has been promoted to admin"}
 
+# --- FORCE LOGOUT (invalidates every token the user holds) ---
+@router.post("/{user_id}/revoke-tokens")
+def revoke_user_tokens(
+    user_id: int,
+    db: Session = Depends(get_db),
+    current_admin=Depends(require_admin)
+):
+    user = db.query(models.User).filter(models.User.id == user_id).first()
+
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    revoke_all_tokens(db, user)
+    audit.record("tokens_revoked", email=user.email, user_id=user.id, detail=f"by {current_admin.email}")
+
+    return {"message": f"All tokens for {user.email} have been revoked"}
+
 @router.get("/admin-only")
 def admin_dashboard(admin=Depends(require_admin)):
-    return {"message": "Welcome admin"}
\ No newline at end of file
+    return {"message": "Welcome admin"}
+
+# --- REVOKED TOKEN MAINTENANCE ---
+@router.get("/admin/revocations")
+def revocation_stats(
+    db: Session = Depends(get_read_db),
+    admin=Depends(require_admin)
+):
+    return revocation_table_stats(db)
+
+@router.post("/admin/revocations/purge")
+def purge_revocations(
+    db: Session = Depends(get_db),
+    admin=Depends(require_admin)
+):
+    deleted = purge_expired_revocations(db, settings.REVOKED_PURGE_BATCH_SIZE)
+    sessions_deleted = purge_expired_sessions(db, settings.REVOKED_PURGE_BATCH_SIZE)
+    return {"deleted": deleted, "sessions_deleted": sessions_deleted, **revocation_table_stats(db)}
+
+@router.get("/admin/db-pool")
+def db_pool_stats(admin=Depends(require_admin)):
+    return pool_status()
+
+# --- REQUEST PROFILES (see app/profiling.py) ---
+@router.get("/admin/profiles")
+def list_profiles(admin=Depends(require_admin)):
+    if not os.path.isdir(settings.PROFILING_DIR):
+        return []
+    return sorted((n for n in os.listdir(settings.PROFILING_DIR) if PROFILE_NAME.match(n)), reverse=True)
+
+@router.get("/admin/profiles/{name}")
+def download_profile(name: str, admin=Depends(require_admin)):
+    path = os.path.join(settings.PROFILING_DIR, name)
+    if not PROFILE_NAME.match(name) or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=name)
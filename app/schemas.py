@@ -1,6 +1,13 @@
-from pydantic import BaseModel, EmailStr, field_validator, ConfigDict
+from pydantic import BaseModel, EmailStr, field_validator, ConfigDict, Field
+from datetime import datetime
+from typing import Any, Literal
 import re
 
+from app.config import settings
+from app.services.breached_passwords import is_breached_password
+
+BREACHED_PASSWORD_MESSAGE = "This password has appeared in a data breach. Please choose a different one."
+
 class UserCreate(BaseModel):
     email: EmailStr
     password: str
@@ -14,6 +21,8 @@ class UserCreate(BaseModel):
             raise ValueError("Password must contain at least one letter.")
         if not re.search(r"\d", v):
             raise ValueError("Password must contain at least one digit.")
+        if is_breached_password(v):
+            raise ValueError(BREACHED_PASSWORD_MESSAGE)
         return v
 
 class UserLogin(BaseModel):
@@ -28,6 +37,20 @@ class UserOut(BaseModel):
     # Pydantic V2 syntax: Use ConfigDict instead of class Config
     model_config = ConfigDict(from_attributes=True)
 
+class UserPage(BaseModel):
+    items: list[UserOut]
+    # Pass as after_id to get the next page; None on the last page
+    next_cursor: int | None = None
+
+class SessionOut(BaseModel):
+    id: str
+    created_at: datetime
+    last_used_at: datetime | None
+    expires_at: datetime
+    user_agent: str | None
+    ip_address: str | None
+    current: bool = False
+
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
@@ -37,4 +60,16 @@ class ForgotPasswordRequest(BaseModel):
 
 class ResetPasswordRequest(BaseModel):
     token: str
-    new_password: str
\ No newline at end of file
+    new_password: str
+
+class IntrospectRequest(BaseModel):
+    tokens: list[str] = Field(min_length=1, max_length=settings.INTROSPECT_MAX_TOKENS)
+
+class TokenIntrospection(BaseModel):
+    active: bool
+    status: Literal["active", "revoked", "expired", "invalid"]
+    claims: dict[str, Any] | None = None
+    role: str | None = None
+
+class IntrospectResponse(BaseModel):
+    results: list[TokenIntrospection]
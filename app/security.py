@@ -1,17 +1,84 @@
+import asyncio
+from contextlib import contextmanager
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from jose import jwt
-from passlib.context import CryptContext
+from typing import TYPE_CHECKING
+import contextvars
 import hashlib
+import logging
+import math
+import threading
+import time
+
+from app import metrics
+from app.keyring import get_keyring
 
 # Importing direct variables from config (backwards compatible setup)
 from app.config import (
     SECRET_KEY, 
     ALGORITHM, 
     ACCESS_TOKEN_EXPIRE_MINUTES, 
-    REFRESH_TOKEN_EXPIRE_DAYS
+    REFRESH_TOKEN_EXPIRE_DAYS,
+    settings,
 )
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+
+def password_context_config(
+    bcrypt_rounds: int | None = None,
+    argon2_time_cost: int | None = None,
+    argon2_memory_cost: int | None = None,
+) -> dict:
+    """
+    CryptContext settings. The first scheme in PASSWORD_HASH_SCHEMES hashes new
+    passwords; the others are deprecated, so verify_and_update migrates them.
+    Setting a cost also sets it as the minimum, which flags weaker hashes as
+    stale and gets them rehashed on the user's next login.
+    """
+    config = {
+        "schemes": [s.strip() for s in settings.PASSWORD_HASH_SCHEMES.split(",") if s.strip()],
+        "deprecated": "auto",
+    }
+    rounds = bcrypt_rounds or settings.BCRYPT_ROUNDS
+    if rounds:
+        config.update({"bcrypt__rounds": rounds, "bcrypt__min_rounds": rounds})
+    if "argon2" in config["schemes"]:
+        config["argon2__time_cost"] = argon2_time_cost or settings.ARGON2_TIME_COST
+        config["argon2__memory_cost"] = argon2_memory_cost or settings.ARGON2_MEMORY_COST
+    return config
+
+
+# Built on first use: importing passlib and its handlers is part of cold start
+_pwd_context: "CryptContext | None" = None
+_pwd_context_lock = threading.Lock()
+
+
+def get_pwd_context() -> "CryptContext":
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+
+        with _pwd_context_lock:
+            if _pwd_context is None:
+                _pwd_context = CryptContext(**password_context_config())
+    return _pwd_context
+
+
+def _load_pwd_context(config: dict) -> None:
+    # Process-pool initializer: copy the parent's (possibly calibrated) config
+    get_pwd_context().load(config)
+
+
+def __getattr__(name: str):
+    # `security.pwd_context` keeps working for callers that predate the lazy init
+    if name == "pwd_context":
+        return get_pwd_context()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # -----------------------------
 # Password helpers
@@ -23,19 +90,219 @@ def _normalize_password(password: str) -> str:
 
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(_normalize_password(password))
+    return get_pwd_context().hash(_normalize_password(password))
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(
+    return get_pwd_context().verify(
+        _normalize_password(plain_password),
+        hashed_password
+    )
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """Like verify_password, plus a replacement hash if the stored one is stale."""
+    return get_pwd_context().verify_and_update(
         _normalize_password(plain_password),
         hashed_password
     )
 
 
+# -----------------------------
+# Hash cost calibration
+# -----------------------------
+def _time_hash(context: "CryptContext", samples: int = 3) -> float:
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.hash("calibration-password-123")
+        timings.append(time.perf_counter() - started)
+    return sorted(timings)[len(timings) // 2]
+
+
+def calibrate_bcrypt_rounds(target_ms: float, min_rounds: int | None = None) -> int:
+    """
+    Highest bcrypt cost whose hash time stays within target_ms on this machine.
+    Never below BCRYPT_MIN_ROUNDS, nor below BCRYPT_ROUNDS when that is set:
+    calibration may raise the configured cost, not weaken it.
+    """
+    from passlib.context import CryptContext
+
+    min_rounds = max(min_rounds or settings.BCRYPT_MIN_ROUNDS, settings.BCRYPT_ROUNDS or 0)
+    base = _time_hash(CryptContext(schemes=["bcrypt"], bcrypt__rounds=min_rounds))
+    # Each extra round doubles the work
+    rounds = min_rounds + max(int(math.floor(math.log2(target_ms / 1000 / base))), 0)
+    rounds = min(rounds, 31)
+    while rounds > min_rounds and _time_hash(
+        CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds), samples=1
+    ) * 1000 > target_ms:
+        rounds -= 1
+    return rounds
+
+
+def calibrate_argon2_time_cost(target_ms: float, memory_cost: int | None = None) -> int:
+    """Highest argon2 time_cost (at a fixed memory cost) within target_ms."""
+    from passlib.context import CryptContext
+
+    memory_cost = memory_cost or settings.ARGON2_MEMORY_COST
+    time_cost = 1
+    while time_cost < 32:
+        context = CryptContext(
+            schemes=["argon2"], argon2__time_cost=time_cost + 1, argon2__memory_cost=memory_cost
+        )
+        if _time_hash(context, samples=1) * 1000 > target_ms:
+            break
+        time_cost += 1
+    return time_cost
+
+
+def configure_password_hashing(**costs) -> None:
+    """Reload pwd_context with new costs (see password_context_config)."""
+    get_pwd_context().load(password_context_config(**costs))
+    if settings.HASH_EXECUTOR == "process":
+        # Worker processes copy the config when they start, so restart them
+        shutdown_hash_executor()
+
+
+def calibrate_password_hashing(target_ms: float) -> dict:
+    """Measure this machine and apply the costs that hit target_ms per hash."""
+    costs = {"bcrypt_rounds": calibrate_bcrypt_rounds(target_ms)}
+    if "argon2" in settings.PASSWORD_HASH_SCHEMES:
+        costs["argon2_time_cost"] = calibrate_argon2_time_cost(target_ms)
+    configure_password_hashing(**costs)
+    logger.info("Password hashing calibrated for %sms: %s", target_ms, costs)
+    return costs
+
+
+# -----------------------------
+# Hashing executor
+# -----------------------------
+# bcrypt is deliberately slow. Running it on a dedicated, bounded pool caps
+# how many cores it can take during login bursts, and HashAdmission turns
+# away work beyond that. The auth routes are async and await these jobs, so
+# waiting logins hold no Starlette threadpool thread and the cheap
+# token-only endpoints keep theirs.
+_hash_executor: Executor | None = None
+_hash_executor_lock = threading.Lock()
+
+
+def get_hash_executor() -> Executor:
+    global _hash_executor
+    if _hash_executor is None:
+        with _hash_executor_lock:
+            if _hash_executor is None:
+                workers = settings.HASH_EXECUTOR_WORKERS
+                if settings.HASH_EXECUTOR == "process":
+                    _hash_executor = ProcessPoolExecutor(
+                        max_workers=workers,
+                        initializer=_load_pwd_context,
+                        initargs=(get_pwd_context().to_dict(),),
+                    )
+                else:
+                    _hash_executor = ThreadPoolExecutor(
+                        max_workers=workers, thread_name_prefix="hash"
+                    )
+    return _hash_executor
+
+
+def shutdown_hash_executor() -> None:
+    global _hash_executor
+    with _hash_executor_lock:
+        if _hash_executor is not None:
+            _hash_executor.shutdown(wait=True)
+            _hash_executor = None
+
+
+class HashingOverloaded(Exception):
+    """Raised when the hashing queue is full; mapped to 503 + Retry-After."""
+
+
+class HashAdmission:
+    """
+    Global cap on hashing work: pool workers plus HASH_MAX_QUEUE waiting jobs.
+
+    Beyond that, new requests are turned away immediately instead of queueing
+    CPU work that would only finish after the client has given up.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    @property
+    def limit(self) -> int:
+        return settings.HASH_EXECUTOR_WORKERS + settings.HASH_MAX_QUEUE
+
+    @contextmanager
+    def admit(self):
+        with self._lock:
+            if self.in_flight >= self.limit:
+                self.rejected += 1
+                raise HashingOverloaded()
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+hash_admission = HashAdmission()
+
+
+async def _run_hash_job(stage: str, fn, *args):
+    loop = asyncio.get_running_loop()
+    if settings.HASH_EXECUTOR != "process":
+        # In the caller's context, so the profiler can tell whose job it is
+        fn, args = contextvars.copy_context().run, (fn, *args)
+    with hash_admission.admit(), metrics.stage(stage):
+        return await loop.run_in_executor(get_hash_executor(), fn, *args)
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_hash_job("bcrypt_hash", hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_hash_job("bcrypt_verify", verify_password, plain_password, hashed_password)
+
+
+async def verify_and_update_password_async(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    return await _run_hash_job(
+        "bcrypt_verify", verify_and_update_password, plain_password, hashed_password
+    )
+
+
 # -----------------------------
 # JWT helpers (timezone-aware)
 # -----------------------------
+def hash_token(token: str) -> str:
+    """Fixed-width digest used to store and look up revoked tokens."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def uses_keyring() -> bool:
+    # HS* keeps the shared SECRET_KEY; RS256/ES256 sign with the rotating keyring
+    return not ALGORITHM.startswith("HS")
+
+
+def _encode(to_encode: dict) -> str:
+    if uses_keyring():
+        return get_keyring().sign(to_encode)
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def decode_token(token: str, **kwargs) -> dict:
+    """Verify a token we issued, whichever signing mode is configured."""
+    with metrics.stage("jwt_decode"):
+        if uses_keyring():
+            return get_keyring().decode(token, **kwargs)
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], **kwargs)
+
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
 
@@ -50,7 +317,7 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
         "type": "access"
     })
 
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return _encode(to_encode)
 
 
 def create_refresh_token(data: dict):
@@ -65,7 +332,7 @@ def create_refresh_token(data: dict):
         "type": "refresh"
     })
 
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return _encode(to_encode)
 
 
 # -----------------------------
@@ -82,4 +349,4 @@ def create_password_reset_token(data: dict):
         "type": "reset"
     })
 
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
\ No newline at end of file
+    return _encode(to_encode)
\ No newline at end of file
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from app import database, models
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class AuditLog:
+    """
+    Bounded in-memory buffer of audit events.
+
+    Handlers only append here, which never blocks on I/O; a background task
+    drains the buffer in batches. When the buffer is full the drop policy
+    decides what to lose: "oldest" keeps the most recent events, "newest"
+    keeps the ones already queued. Either way the loss is counted.
+    """
+
+    def __init__(self, capacity: int, drop_policy: str = "oldest"):
+        if drop_policy not in ("oldest", "newest"):
+            raise ValueError(f"Unknown audit drop policy: {drop_policy}")
+        self.capacity = capacity
+        self.drop_policy = drop_policy
+        self._buffer: deque[dict] = deque()
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.flush_failures = 0
+
+    def record(
+        self,
+        event: str,
+        email: str | None = None,
+        user_id: int | None = None,
+        ip_address: str | None = None,
+        success: bool = True,
+        detail: str | None = None,
+    ) -> None:
+        entry = {
+            "created_at": datetime.now(timezone.utc).replace(tzinfo=None),
+            "event": event,
+            "email": email,
+            "user_id": user_id,
+            "ip_address": ip_address,
+            "success": success,
+            "detail": detail[:255] if detail else None,
+        }
+        with self._lock:
+            if len(self._buffer) >= self.capacity:
+                self.dropped += 1
+                if self.drop_policy == "newest":
+                    return
+                self._buffer.popleft()
+            self._buffer.append(entry)
+            self.recorded += 1
+
+    def drain(self, max_items: int) -> list[dict]:
+        with self._lock:
+            return [self._buffer.popleft() for _ in range(min(max_items, len(self._buffer)))]
+
+    def mark_flushed(self, count: int) -> None:
+        with self._lock:
+            self.flushed += count
+
+    def requeue(self, batch: list[dict]) -> None:
+        """Put a batch that failed to flush back at the front, space permitting."""
+        with self._lock:
+            self.flush_failures += 1
+            room = self.capacity - len(self._buffer)
+            keep = batch[:max(room, 0)]
+            self.dropped += len(batch) - len(keep)
+            self._buffer.extendleft(reversed(keep))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buffer.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "buffered": len(self._buffer),
+                "capacity": self.capacity,
+                "recorded_total": self.recorded,
+                "dropped_total": self.dropped,
+                "flushed_total": self.flushed,
+                "flush_failures_total": self.flush_failures,
+            }
+
+
+audit_log = AuditLog(settings.AUDIT_BUFFER_SIZE, settings.AUDIT_DROP_POLICY)
+
+
+def record(event: str, **fields) -> None:
+    """Queue one audit event; see AuditLog.record for the fields."""
+    if settings.AUDIT_SINK != "none":
+        audit_log.record(event, **fields)
+
+
+# -----------------------------
+# Sinks
+# -----------------------------
+def write_to_database(session_factory: sessionmaker, batch: list[dict]) -> None:
+    db = session_factory()
+    try:
+        # One executemany INSERT for the whole batch
+        db.execute(insert(models.AuditEvent), batch)
+        db.commit()
+    finally:
+        db.close()
+
+
+def write_to_file(path: str, batch: list[dict]) -> None:
+    lines = "".join(
+        json.dumps({**entry, "created_at": entry["created_at"].isoformat() + "Z"}) + "\n"
+        for entry in batch
+    )
+    # Append-only; one write per batch
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(lines)
+
+
+async def flush_audit(session_factory: sessionmaker | None = None) -> int:
+    """Write everything buffered so far, in batches. Returns events written."""
+    written = 0
+    while batch := audit_log.drain(settings.AUDIT_BATCH_SIZE):
+        try:
+            if settings.AUDIT_SINK == "file":
+                await asyncio.to_thread(write_to_file, settings.AUDIT_FILE_PATH, batch)
+            else:
+                await asyncio.to_thread(
+                    write_to_database, session_factory or database.get_sessionmaker(), batch
+                )
+        except Exception:
+            audit_log.requeue(batch)
+            logger.exception("Audit flush failed, %d events requeued", len(batch))
+            break
+        audit_log.mark_flushed(len(batch))
+        written += len(batch)
+    return written
+
+
+async def run_audit_flusher(interval_seconds: float) -> None:
+    """Background loop started from the app lifespan."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        await flush_audit()
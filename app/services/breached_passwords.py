@@ -0,0 +1,177 @@
+"""
+Offline breached-password check against a local corpus (e.g. the HIBP SHA-1
+dump), converted once into a sorted, fixed-width binary index:
+
+    MAGIC (8 bytes) | record count (uint64) | prefix table | records
+
+Records are 20-byte SHA-1 digests in ascending order. The prefix table holds
+65537 uint64 record offsets, one per leading 2-byte prefix plus an end
+marker, so a lookup is a binary search over one small bucket. The file is
+memory-mapped read-only: the OS pages in only the buckets that are touched.
+"""
+import hashlib
+import heapq
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+from typing import Iterable, Iterator
+
+from app.config import settings
+
+MAGIC = b"PWNIDX01"
+RECORD_SIZE = 20
+PREFIX_BUCKETS = 1 << 16
+_HEADER = struct.Struct("<8sQ")
+_TABLE = struct.Struct(f"<{PREFIX_BUCKETS + 1}Q")
+DATA_OFFSET = _HEADER.size + _TABLE.size
+
+_HEX_DIGEST = re.compile(r"^[0-9A-Fa-f]{40}")
+
+
+class BreachedPasswordIndex:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.count = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or len(self._mm) != DATA_OFFSET + self.count * RECORD_SIZE:
+            self._mm.close()
+            raise ValueError(f"{path} is not a breached-password index")
+        self._table = _TABLE.unpack_from(self._mm, _HEADER.size)
+
+    def __contains__(self, digest: bytes) -> bool:
+        prefix = int.from_bytes(digest[:2], "big")
+        lo, hi = self._table[prefix], self._table[prefix + 1]
+        mm = self._mm
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = DATA_OFFSET + mid * RECORD_SIZE
+            record = mm[start:start + RECORD_SIZE]
+            if record < digest:
+                lo = mid + 1
+            elif record > digest:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def __len__(self) -> int:
+        return self.count
+
+    def is_breached(self, password: str) -> bool:
+        return hashlib.sha1(password.encode("utf-8")).digest() in self
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+# -----------------------------
+# Process-wide index
+# -----------------------------
+_index: BreachedPasswordIndex | None = None
+_index_loaded = False
+_index_lock = threading.Lock()
+
+
+def get_index() -> BreachedPasswordIndex | None:
+    """The configured index, opened on first use; None if the check is off."""
+    global _index, _index_loaded
+    if not _index_loaded:
+        with _index_lock:
+            if not _index_loaded:
+                if settings.BREACHED_PASSWORDS_PATH:
+                    _index = BreachedPasswordIndex(settings.BREACHED_PASSWORDS_PATH)
+                _index_loaded = True
+    return _index
+
+
+def set_index(index: BreachedPasswordIndex | None) -> None:
+    global _index, _index_loaded
+    with _index_lock:
+        _index, _index_loaded = index, True
+
+
+def is_breached_password(password: str) -> bool:
+    index = get_index()
+    return index is not None and index.is_breached(password)
+
+
+# -----------------------------
+# Building an index
+# -----------------------------
+def parse_digest(line: str, plaintext: bool = False) -> bytes | None:
+    """
+    One corpus line to a SHA-1 digest. HIBP lines look like "HEX:count";
+    with plaintext=True each line is a password and is hashed here.
+    """
+    line = line.rstrip("\r\n")
+    if plaintext:
+        return hashlib.sha1(line.encode("utf-8")).digest() if line else None
+    match = _HEX_DIGEST.match(line)
+    return bytes.fromhex(match.group(0)) if match else None
+
+
+def _write_run(digests: list[bytes], directory: str) -> str:
+    digests.sort()
+    fd, path = tempfile.mkstemp(suffix=".run", dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        f.write(b"".join(digests))
+    return path
+
+
+def _read_run(path: str) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while record := f.read(RECORD_SIZE):
+            yield record
+
+
+def build_index(digests: Iterable[bytes], out_path: str, chunk_records: int = 5_000_000) -> int:
+    """
+    Write an index from digests in any order, with duplicates. Uses an
+    external merge sort: at most chunk_records digests are held in memory,
+    sorted runs are spilled to disk and then merged. Returns the record count.
+    """
+    out_dir = os.path.dirname(os.path.abspath(out_path))
+    with tempfile.TemporaryDirectory(dir=out_dir) as work_dir:
+        runs, chunk = [], []
+        for digest in digests:
+            chunk.append(digest)
+            if len(chunk) >= chunk_records:
+                runs.append(_write_run(chunk, work_dir))
+                chunk = []
+        if chunk or not runs:
+            runs.append(_write_run(chunk, work_dir))
+
+        counts = [0] * PREFIX_BUCKETS
+        fd, tmp_path = tempfile.mkstemp(suffix=".idx", dir=out_dir)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                out.seek(DATA_OFFSET)
+                total, previous = 0, None
+                for record in heapq.merge(*(_read_run(run) for run in runs)):
+                    if record == previous:
+                        continue
+                    out.write(record)
+                    counts[int.from_bytes(record[:2], "big")] += 1
+                    previous = record
+                    total += 1
+
+                table, offset = [], 0
+                for count in counts:
+                    table.append(offset)
+                    offset += count
+                table.append(offset)
+
+                out.seek(0)
+                out.write(_HEADER.pack(MAGIC, total))
+                out.write(_TABLE.pack(*table))
+            # Readers never see a half-written index
+            os.replace(tmp_path, out_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    return total
@@ -0,0 +1,30 @@
+import time
+
+from app.config import settings
+from app.security import decode_token
+from app.services.cache import TTLCache
+
+# Verified access-token claims, keyed by the token's SHA-256 digest. An entry
+# never outlives its token: its TTL is the time left until the "exp" claim.
+claims_cache = TTLCache(
+    max_size=settings.CLAIMS_CACHE_MAX_SIZE,
+    ttl_seconds=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+)
+
+
+def decode_token_cached(token: str, token_hash: str) -> dict:
+    """
+    decode_token, but signature verification runs once per token rather than
+    once per request. Raises JWTError like decode_token on a miss.
+
+    Revocation is still checked by the caller on every request, so a cached
+    entry never lets a revoked token through.
+    """
+    claims = claims_cache.get(token_hash)
+    if claims is None:
+        claims = decode_token(token)
+        remaining = claims.get("exp", 0) - time.time()
+        if remaining > 0:
+            claims_cache.set(token_hash, claims, ttl_seconds=remaining)
+    # Callers get their own copy; the cached dict is shared between requests
+    return dict(claims)
@@ -1,32 +1,60 @@
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
 from pydantic import EmailStr
+from sqlalchemy.orm import Session
+
+from app import models
 from app.config import settings
 
-# Configuration pulls directly from settings (which reads .env)
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.MAIL_USERNAME,
-    MAIL_PASSWORD=settings.MAIL_PASSWORD,
-    MAIL_FROM=settings.MAIL_FROM,
-    MAIL_PORT=settings.MAIL_PORT,
-    MAIL_SERVER=settings.MAIL_SERVER,
-    MAIL_STARTTLS=settings.MAIL_STARTTLS,
-    MAIL_SSL_TLS=settings.MAIL_SSL_TLS,
-    USE_CREDENTIALS=settings.USE_CREDENTIALS,
-    VALIDATE_CERTS=True
-)
-
-fm = FastMail(conf)
-
-async def send_reset_email(email_to: EmailStr, token: str):
+if TYPE_CHECKING:
+    from fastapi_mail import ConnectionConfig, FastMail
+
+# fastapi_mail is slow to import and only the outbox worker sends mail, so
+# the config and client are built on first use rather than at startup
+@lru_cache()
+def get_mail_config() -> "ConnectionConfig":
+    from fastapi_mail import ConnectionConfig
+
+    # Configuration pulls directly from settings (which reads .env)
+    return ConnectionConfig(
+        MAIL_USERNAME=settings.MAIL_USERNAME,
+        MAIL_PASSWORD=settings.MAIL_PASSWORD,
+        MAIL_FROM=settings.MAIL_FROM,
+        MAIL_PORT=settings.MAIL_PORT,
+        MAIL_SERVER=settings.MAIL_SERVER,
+        MAIL_STARTTLS=settings.MAIL_STARTTLS,
+        MAIL_SSL_TLS=settings.MAIL_SSL_TLS,
+        USE_CREDENTIALS=settings.USE_CREDENTIALS,
+        VALIDATE_CERTS=True
+    )
+
+@lru_cache()
+def get_mail_client() -> "FastMail":
+    from fastapi_mail import FastMail
+
+    return FastMail(get_mail_config())
+
+def __getattr__(name: str):
+    # The old module-level `conf` and `fm` names, built on first access
+    if name == "conf":
+        return get_mail_config()
+    if name == "fm":
+        return get_mail_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+RESET_SUBJECT = "Password Reset Request"
+
+def build_reset_email(token: str) -> str:
     """
-    Sends a password reset email with the token embedded in a link.
+    Renders the password reset email with the token embedded in a link.
     """
-    
+
     # In a real React app, this would be: https://myapp.com/reset-password?token=...
     # For now, pointing to docs
     reset_link = f"http://localhost:8000/docs?token={token}"
 
-    html = f"""
+    return f"""
     <p>Hello,</p>
     <p>You requested to reset your password. Click the link below to reset it:</p>
     <p>
@@ -36,11 +64,13 @@ async def send_reset_email(email_to: EmailStr, token: str):
     <p>If you did not request this, please ignore this email.</p>
     """
 
-    message = MessageSchema(
-        subject="Password Reset Request",
-        recipients=[email_to],
-        body=html,
-        subtype="html"
-    )
-
-    await fm.send_message(message)
\ No newline at end of file
+def enqueue_reset_email(db: Session, email_to: EmailStr, token: str):
+    """
+    Stores the reset email in the outbox; the outbox worker delivers it.
+    """
+    db.add(models.EmailOutbox(
+        recipient=email_to,
+        subject=RESET_SUBJECT,
+        body=build_reset_email(token),
+    ))
+    db.commit()
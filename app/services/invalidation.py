@@ -0,0 +1,214 @@
+"""
+Cross-worker cache invalidation.
+
+Each worker keeps in-process caches (revocations, users, verified claims).
+Write paths publish an event here; it is applied to this worker's caches
+immediately and broadcast to every other worker, which applies it when it
+arrives. Backends: "memory" (single process and tests), "postgres"
+(LISTEN/NOTIFY on the main database) and "redis" (pub/sub).
+"""
+import asyncio
+import json
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable
+
+from sqlalchemy import make_url, text
+
+from app import database
+from app.config import settings
+from app.services.claims_cache import claims_cache
+from app.services.revocation import revocation_cache
+from app.services.user_cache import invalidate_user, user_cache
+
+logger = logging.getLogger(__name__)
+
+# Lets a worker skip its own broadcasts, which it has already applied
+ORIGIN = uuid.uuid4().hex
+
+
+class InvalidationBackend(ABC):
+    """
+    ``publish`` sends one message to every worker. ``listen`` calls
+    ``on_message`` for each message received and ``on_connect`` whenever the
+    subscription is (re)established, until cancelled.
+    """
+
+    @abstractmethod
+    def publish(self, message: str) -> None:
+        ...
+
+    @abstractmethod
+    async def listen(
+        self, on_message: Callable[[str], None], on_connect: Callable[[], Awaitable[None]]
+    ) -> None:
+        ...
+
+
+class InMemoryBackend(InvalidationBackend):
+    """Delivers to subscribers in this process; tests subscribe fake workers."""
+
+    def __init__(self):
+        self.subscribers: list[Callable[[str], None]] = []
+
+    def publish(self, message: str) -> None:
+        for subscriber in list(self.subscribers):
+            subscriber(message)
+
+    async def listen(self, on_message, on_connect) -> None:
+        self.subscribers.append(on_message)
+        try:
+            await on_connect()
+            await asyncio.Event().wait()
+        finally:
+            self.subscribers.remove(on_message)
+
+
+class PostgresBackend(InvalidationBackend):
+    """
+    NOTIFY through the existing sync pool; LISTEN on one dedicated asyncpg
+    connection per worker (NOTIFY payloads are limited to 8000 bytes, far more
+    than an event needs).
+    """
+
+    def __init__(self, url: str, channel: str):
+        self.url = make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self.channel = channel
+
+    def publish(self, message: str) -> None:
+        with database.get_engine().begin() as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :message)"),
+                         {"channel": self.channel, "message": message})
+
+    async def listen(self, on_message, on_connect) -> None:
+        import asyncpg
+
+        conn = await asyncpg.connect(self.url)
+        lost = asyncio.Event()
+        conn.add_termination_listener(lambda _conn: lost.set())
+        try:
+            await conn.add_listener(self.channel, lambda _c, _pid, _ch, payload: on_message(payload))
+            await on_connect()
+            await lost.wait()
+            raise ConnectionError("LISTEN connection closed")
+        finally:
+            await conn.close()
+
+
+class RedisBackend(InvalidationBackend):
+    """Pub/sub on any server that speaks the Redis protocol."""
+
+    def __init__(self, url: str, channel: str, client=None):
+        self.url = url
+        self.channel = channel
+        if client is None:
+            import redis  # only needed for this backend
+
+            client = redis.Redis.from_url(url)
+        self.client = client
+
+    def publish(self, message: str) -> None:
+        self.client.publish(self.channel, message)
+
+    def _listen_client(self):
+        import redis.asyncio
+
+        return redis.asyncio.Redis.from_url(self.url)
+
+    async def listen(self, on_message, on_connect) -> None:
+        client = self._listen_client()
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(self.channel)
+            await on_connect()
+            async for message in pubsub.listen():
+                on_message(message["data"].decode())
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+
+def _create_backend() -> InvalidationBackend:
+    channel = settings.INVALIDATION_CHANNEL
+    if settings.INVALIDATION_BACKEND == "postgres":
+        return PostgresBackend(settings.DATABASE_URL, channel)
+    if settings.INVALIDATION_BACKEND == "redis":
+        return RedisBackend(settings.INVALIDATION_REDIS_URL or settings.RATE_LIMIT_REDIS_URL, channel)
+    return InMemoryBackend()
+
+
+backend: InvalidationBackend = _create_backend()
+
+
+def set_backend(new_backend: InvalidationBackend) -> None:
+    global backend
+    backend = new_backend
+
+
+# -----------------------------
+# Events
+# -----------------------------
+def apply(event: dict) -> None:
+    if event["kind"] == "user":
+        invalidate_user(event["email"])
+    elif event["kind"] == "token_revoked":
+        revocation_cache.add(event["token_hash"], event["expires_at"])
+        claims_cache.invalidate(event["token_hash"])
+
+
+def publish(event: dict) -> None:
+    apply(event)
+    try:
+        backend.publish(json.dumps({**event, "origin": ORIGIN}))
+    except Exception:
+        # The write is committed; peers catch up via TTLs or their next resync
+        logger.exception("Failed to broadcast invalidation %s", event["kind"])
+
+
+def user_changed(email: str) -> None:
+    """A user's row changed (role, password, token_version...)."""
+    publish({"kind": "user", "email": email})
+
+
+def token_revoked(token_hash: str, expires_at: int) -> None:
+    publish({"kind": "token_revoked", "token_hash": token_hash, "expires_at": expires_at})
+
+
+def handle_message(message: str) -> None:
+    try:
+        event = json.loads(message)
+        if event.get("origin") != ORIGIN:
+            apply(event)
+    except Exception:
+        logger.exception("Ignoring malformed invalidation message")
+
+
+async def resync() -> None:
+    """
+    Called on every (re)subscribe: events may have been missed while
+    disconnected, so drop what could be stale and reload revocations.
+    """
+    user_cache.clear()
+    claims_cache.clear()
+
+    def warm():
+        db = database.SessionLocal()
+        try:
+            revocation_cache.warm(db)
+        finally:
+            db.close()
+
+    await asyncio.to_thread(warm)
+
+
+async def run_invalidation_listener(retry_seconds: float = 1.0) -> None:
+    """Background loop started from the app lifespan."""
+    while True:
+        try:
+            await backend.listen(handle_message, resync)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Invalidation listener failed, reconnecting")
+        await asyncio.sleep(retry_seconds)
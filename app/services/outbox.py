@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING
+
+from sqlalchemy import delete
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import database, metrics, models
+from app.config import settings
+
+if TYPE_CHECKING:
+    from fastapi_mail import ConnectionConfig
+
+logger = logging.getLogger(__name__)
+
+# How often the worker deletes old sent and failed rows
+PURGE_INTERVAL_SECONDS = 3600
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff: base, 2*base, 4*base ... capped at the max."""
+    seconds = settings.OUTBOX_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0)
+    return timedelta(seconds=min(seconds, settings.OUTBOX_RETRY_MAX_SECONDS))
+
+
+def claim_due_batch(db: Session, batch_size: int) -> list[dict]:
+    """
+    Lease up to batch_size due messages by pushing their next_attempt_at out.
+
+    The lease stops another worker (or the next poll) from picking up the same
+    rows while they are being sent. If this worker dies mid-send, the rows
+    become due again once the lease expires.
+    """
+    now = _utcnow()
+    rows = (
+        db.query(models.EmailOutbox)
+        .filter(
+            models.EmailOutbox.status == "pending",
+            models.EmailOutbox.next_attempt_at <= now,
+        )
+        .order_by(models.EmailOutbox.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    lease_until = now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+    batch = []
+    for row in rows:
+        row.next_attempt_at = lease_until
+        batch.append({"id": row.id, "recipient": row.recipient, "subject": row.subject, "body": row.body})
+    db.commit()
+    return batch
+
+
+def record_results(db: Session, results: dict[int, str | None]) -> None:
+    """
+    Mark each message sent (error is None) or schedule its retry.
+
+    Bodies carry live reset links, so they are blanked as soon as a row
+    won't be sent again; only the delivery record is kept.
+    """
+    now = _utcnow()
+    for row in db.query(models.EmailOutbox).filter(models.EmailOutbox.id.in_(results)):
+        error = results[row.id]
+        row.attempts += 1
+        if error is None:
+            row.status = "sent"
+            row.sent_at = now
+            row.last_error = None
+            row.body = ""
+        elif row.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            row.status = "failed"
+            row.last_error = error
+            row.body = ""
+        else:
+            row.next_attempt_at = now + retry_delay(row.attempts)
+            row.last_error = error
+    db.commit()
+
+
+def purge_outbox(db: Session, older_than: timedelta, batch_size: int) -> int:
+    """Delete sent and failed rows created more than older_than ago, in batches."""
+    cutoff = _utcnow() - older_than
+    deleted = 0
+    while True:
+        ids = [
+            row_id for (row_id,) in db.query(models.EmailOutbox.id)
+            .filter(
+                models.EmailOutbox.status.in_(("sent", "failed")),
+                models.EmailOutbox.created_at <= cutoff,
+            )
+            .limit(batch_size)
+        ]
+        if not ids:
+            return deleted
+        db.execute(delete(models.EmailOutbox).where(models.EmailOutbox.id.in_(ids)))
+        db.commit()
+        deleted += len(ids)
+
+
+async def _send_batch(mail_config: "ConnectionConfig", batch: list[dict]) -> dict[int, str | None]:
+    from fastapi_mail import FastMail, MessageSchema
+    # FastMail.send_message also sends a list over one connection, but fails
+    # the list as a whole, losing which messages went out. Connection isn't
+    # exported, so requirements.txt pins fastapi-mail to the 1.6 series.
+    from fastapi_mail.connection import Connection
+
+    fm = FastMail(mail_config)
+    prepared = await fm.get_message([
+        MessageSchema(subject=m["subject"], recipients=[m["recipient"]], body=m["body"], subtype="html")
+        for m in batch
+    ])
+
+    results: dict[int, str | None] = {}
+    try:
+        # One SMTP handshake (and login) for the whole batch
+        async with Connection(mail_config) as connection:
+            for message, prepared_message in zip(batch, prepared):
+                try:
+                    if not mail_config.SUPPRESS_SEND:
+                        with metrics.stage("email_send"):
+                            await connection.session.send_message(prepared_message)
+                    results[message["id"]] = None
+                except Exception as e:
+                    results[message["id"]] = str(e)
+    except Exception as e:
+        # Connection or login failed: everything not yet sent is retried
+        for message in batch:
+            results.setdefault(message["id"], str(e))
+    return results
+
+
+def _run_in_session(session_factory: sessionmaker, fn, *args):
+    db = session_factory()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+async def drain_outbox(
+    session_factory: sessionmaker | None = None,
+    mail_config: "ConnectionConfig | None" = None,
+    batch_size: int | None = None,
+) -> int:
+    """Send one batch of due messages. Returns how many were delivered."""
+    from app.services.email_service import get_mail_config
+
+    session_factory = session_factory or database.get_sessionmaker()
+    mail_config = mail_config or get_mail_config()
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+
+    batch = await asyncio.to_thread(_run_in_session, session_factory, claim_due_batch, batch_size)
+    if not batch:
+        return 0
+
+    results = await _send_batch(mail_config, batch)
+    await asyncio.to_thread(_run_in_session, session_factory, record_results, results)
+
+    failed = sum(1 for error in results.values() if error is not None)
+    if failed:
+        logger.warning("Outbox: %d of %d emails failed, will retry", failed, len(batch))
+    return len(batch) - failed
+
+
+async def run_outbox_worker(poll_seconds: float) -> None:
+    """Background loop started from the app lifespan."""
+    next_purge = 0.0
+    while True:
+        try:
+            delivered = await drain_outbox()
+        except Exception:
+            logger.exception("Outbox drain failed")
+            delivered = 0
+        if time.monotonic() >= next_purge:
+            next_purge = time.monotonic() + PURGE_INTERVAL_SECONDS
+            try:
+                deleted = await asyncio.to_thread(
+                    _run_in_session, database.get_sessionmaker(), purge_outbox,
+                    timedelta(hours=settings.OUTBOX_RETENTION_HOURS), settings.OUTBOX_BATCH_SIZE,
+                )
+                if deleted:
+                    logger.info("Outbox: purged %d old rows", deleted)
+            except Exception:
+                logger.exception("Outbox purge failed")
+        # Keep draining without sleeping while there is a backlog
+        if delivered < settings.OUTBOX_BATCH_SIZE:
+            await asyncio.sleep(poll_seconds)
@@ -0,0 +1,124 @@
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from fastapi import HTTPException, status
+
+from app.config import settings
+
+
+class RateLimitBackend(ABC):
+    """
+    Token-bucket store. ``take`` consumes one token from ``key``'s bucket and
+    returns 0 if the request is allowed, or the seconds until a token is free.
+    """
+
+    @abstractmethod
+    def take(self, key: str, rate_per_second: float, burst: int) -> float:
+        ...
+
+    def clear(self) -> None:
+        # Shared stores expire their own keys; only local state needs clearing
+        pass
+
+
+class InMemoryBackend(RateLimitBackend):
+    """Per-process buckets. Idle keys are evicted LRU-style beyond max_keys."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate_per_second: float, burst: int) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate_per_second)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / rate_per_second
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class RedisBackend(RateLimitBackend):
+    """
+    Buckets shared by every worker, kept in Redis (or anything that speaks its
+    EVAL command). The refill-and-take runs as one Lua script so concurrent
+    workers can't double-spend a bucket.
+    """
+
+    SCRIPT = """
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local tokens = tonumber(bucket[1]) or burst
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + (now - updated) * rate)
+    local wait = 0
+    if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, client, prefix: str = "ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+
+    def take(self, key: str, rate_per_second: float, burst: int) -> float:
+        wait = self.client.eval(
+            self.SCRIPT, 1, self.prefix + key, rate_per_second, burst, time.time()
+        )
+        return float(wait)
+
+
+def _create_backend() -> RateLimitBackend:
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        import redis  # only needed for the shared backend
+
+        return RedisBackend(redis.Redis.from_url(settings.RATE_LIMIT_REDIS_URL))
+    return InMemoryBackend()
+
+
+backend: RateLimitBackend = _create_backend()
+
+
+def set_backend(new_backend: RateLimitBackend) -> None:
+    global backend
+    backend = new_backend
+
+
+def _enforce(key: str, per_minute: int, burst: int) -> None:
+    wait = backend.take(key, per_minute / 60, burst)
+    if wait > 0:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many attempts, please try again later",
+            headers={"Retry-After": str(math.ceil(wait))},
+        )
+
+
+def check_login_rate(ip: str | None, email: str) -> None:
+    """
+    Throttle before any bcrypt work: per client IP (spraying many accounts)
+    and per target email (stuffing one account from many IPs).
+    """
+    _enforce(f"login:ip:{ip}", settings.LOGIN_IP_PER_MINUTE, settings.LOGIN_IP_BURST)
+    _enforce(f"login:email:{email.lower()}", settings.LOGIN_EMAIL_PER_MINUTE, settings.LOGIN_EMAIL_BURST)
+
+
+def check_ip_rate(scope: str, ip: str | None) -> None:
+    """Per-IP throttle for the other endpoints that hash passwords."""
+    _enforce(f"{scope}:ip:{ip}", settings.LOGIN_IP_PER_MINUTE, settings.LOGIN_IP_BURST)
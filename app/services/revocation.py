@@ -0,0 +1,244 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, func
+from sqlalchemy.orm import Session
+
+from app import database, metrics, models
+from app.config import settings
+from app.services.claims_cache import claims_cache
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over SHA-256 hex digests.
+
+    The digests are already uniformly distributed, so the k bit positions are
+    derived from the digest itself (double hashing) instead of re-hashing.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, digest: str):
+        h1 = int(digest[:16], 16)
+        h2 = int(digest[16:32], 16) | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, digest: str) -> None:
+        for pos in self._positions(digest):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, digest: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(digest))
+
+
+class RevocationCache:
+    """
+    In-process view of the revoked_tokens table.
+
+    A Bloom filter answers the common "not revoked" case without touching the
+    database. Positives are confirmed against an exact map of digest -> exp;
+    anything the map doesn't know about (Bloom false positive) falls back to a
+    single indexed lookup on the fixed-width digest column.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._bloom = BloomFilter(self.capacity, self.error_rate)
+            self._expiry: dict[str, int] = {}
+            self._next_purge = time.time() + settings.REVOCATION_CACHE_PURGE_SECONDS
+
+    def add(self, token_hash: str, expires_at: int) -> None:
+        with self._lock:
+            self._expiry[token_hash] = expires_at
+            self._bloom.add(token_hash)
+
+    def _purge_expired(self, now: float) -> None:
+        # Bloom filters can't delete, so rebuild from the surviving entries.
+        live = {h: exp for h, exp in self._expiry.items() if exp > now}
+        bloom = BloomFilter(max(self.capacity, len(live)), self.error_rate)
+        for token_hash in live:
+            bloom.add(token_hash)
+        self._expiry, self._bloom = live, bloom
+        self._next_purge = now + settings.REVOCATION_CACHE_PURGE_SECONDS
+
+    def is_revoked(self, db: Session, token_hash: str) -> bool:
+        with metrics.stage("revocation_lookup"):
+            return self._is_revoked(db, token_hash)
+
+    def _is_revoked(self, db: Session, token_hash: str) -> bool:
+        now = time.time()
+        with self._lock:
+            if now >= self._next_purge:
+                self._purge_expired(now)
+            if token_hash not in self._bloom:
+                return False
+            expires_at = self._expiry.get(token_hash)
+        if expires_at is not None:
+            return expires_at > now
+
+        revoked = db.query(models.RevokedToken).filter(
+            models.RevokedToken.token_hash == token_hash
+        ).first()
+        return revoked is not None
+
+    def revoked_among(self, db: Session, token_hashes: list[str]) -> set[str]:
+        """Batch variant of is_revoked: at most one IN (...) query for the lot."""
+        now = time.time()
+        revoked, unknown = set(), []
+        with self._lock:
+            for token_hash in token_hashes:
+                if token_hash not in self._bloom:
+                    continue
+                expires_at = self._expiry.get(token_hash)
+                if expires_at is None:
+                    unknown.append(token_hash)
+                elif expires_at > now:
+                    revoked.add(token_hash)
+
+        if unknown:
+            rows = db.query(models.RevokedToken.token_hash).filter(
+                models.RevokedToken.token_hash.in_(unknown)
+            )
+            revoked.update(token_hash for (token_hash,) in rows)
+        return revoked
+
+    def warm(self, db: Session) -> int:
+        """Load every unexpired revocation so the cache can answer negatives on its own."""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        rows = db.query(
+            models.RevokedToken.token_hash, models.RevokedToken.expires_at
+        ).filter(models.RevokedToken.expires_at > now)
+
+        count = 0
+        for token_hash, expires_at in rows:
+            self.add(token_hash, int(expires_at.replace(tzinfo=timezone.utc).timestamp()))
+            count += 1
+        return count
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+
+revocation_cache = RevocationCache(
+    capacity=settings.REVOCATION_BLOOM_CAPACITY,
+    error_rate=settings.REVOCATION_BLOOM_ERROR_RATE,
+)
+
+
+def revoke_token(db: Session, token_hash: str, expires_at: int) -> None:
+    """Persist a revocation and write it through to the in-process cache."""
+    db.add(models.RevokedToken(
+        token_hash=token_hash,
+        expires_at=datetime.fromtimestamp(expires_at, timezone.utc).replace(tzinfo=None),
+    ))
+    db.commit()
+    revocation_cache.add(token_hash, expires_at)
+    claims_cache.invalidate(token_hash)
+
+
+# -----------------------------
+# Expired row purge
+# -----------------------------
+purge_stats = {
+    "runs": 0,
+    "deleted_total": 0,
+    "last_run_at": None,
+    "last_deleted": 0,
+    "last_duration_seconds": 0.0,
+    "last_rows_per_second": 0.0,
+}
+
+
+def purge_expired_revocations(db: Session, batch_size: int, max_batches: int | None = None) -> int:
+    """
+    Delete revocations whose token has expired, in batches of batch_size.
+
+    Each batch is its own short transaction, so the sweeper never holds long
+    locks on the table. Returns the number of rows deleted.
+    """
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    deleted, batches = 0, 0
+
+    while max_batches is None or batches < max_batches:
+        ids = [
+            row_id for (row_id,) in db.query(models.RevokedToken.id)
+            .filter(models.RevokedToken.expires_at <= now)
+            .limit(batch_size)
+        ]
+        if not ids:
+            break
+        db.execute(delete(models.RevokedToken).where(models.RevokedToken.id.in_(ids)))
+        db.commit()
+        deleted += len(ids)
+        batches += 1
+
+    duration = time.perf_counter() - started
+    purge_stats.update({
+        "runs": purge_stats["runs"] + 1,
+        "deleted_total": purge_stats["deleted_total"] + deleted,
+        "last_run_at": datetime.now(timezone.utc).isoformat(),
+        "last_deleted": deleted,
+        "last_duration_seconds": round(duration, 6),
+        "last_rows_per_second": round(deleted / duration, 1) if duration > 0 else 0.0,
+    })
+    return deleted
+
+
+def revocation_table_stats(db: Session) -> dict:
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    total = db.query(func.count(models.RevokedToken.id)).scalar()
+    expired = db.query(func.count(models.RevokedToken.id)).filter(
+        models.RevokedToken.expires_at <= now
+    ).scalar()
+    return {
+        "rows": total,
+        "expired_rows": expired,
+        "cached_digests": len(revocation_cache),
+        "purge": dict(purge_stats),
+    }
+
+
+def _purge_once() -> tuple[int, int]:
+    from app.services.sessions import purge_expired_sessions
+
+    db = database.SessionLocal()
+    try:
+        return (
+            purge_expired_revocations(db, settings.REVOKED_PURGE_BATCH_SIZE),
+            purge_expired_sessions(db, settings.REVOKED_PURGE_BATCH_SIZE),
+        )
+    finally:
+        db.close()
+
+
+async def run_revocation_sweeper(interval_seconds: float) -> None:
+    """Background loop started from the app lifespan."""
+    while True:
+        try:
+            revocations, sessions = await asyncio.to_thread(_purge_once)
+            if revocations or sessions:
+                logger.info(
+                    "Purged %d expired revoked tokens and %d refresh sessions", revocations, sessions
+                )
+        except Exception:
+            logger.exception("Expired token purge failed")
+        await asyncio.sleep(interval_seconds)
@@ -0,0 +1,191 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from jose import JWTError
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import models, security
+from app.config import settings
+from app.services import invalidation
+
+
+class SessionError(Exception):
+    """Refresh was refused; the message is safe to return to the client."""
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def issue_refresh_token(
+    db: Session,
+    user: models.User,
+    user_agent: str | None = None,
+    ip_address: str | None = None,
+    family_id: str | None = None,
+) -> tuple[str, models.RefreshSession]:
+    """Create a session row and its refresh token. The caller commits."""
+    session = models.RefreshSession(
+        jti=uuid.uuid4().hex,
+        family_id=family_id or uuid.uuid4().hex,
+        user_id=user.id,
+        expires_at=_utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+        user_agent=(user_agent or "")[:255] or None,
+        ip_address=ip_address,
+    )
+    db.add(session)
+    token = security.create_refresh_token(
+        data={
+            "sub": user.email,
+            "ver": user.token_version,
+            "jti": session.jti,
+            "fam": session.family_id,
+        }
+    )
+    return token, session
+
+
+def revoke_family(db: Session, family_id: str) -> None:
+    db.query(models.RefreshSession).filter(
+        models.RefreshSession.family_id == family_id,
+        models.RefreshSession.revoked_at.is_(None),
+    ).update({models.RefreshSession.revoked_at: _utcnow()}, synchronize_session=False)
+
+
+def rotate_refresh_token(
+    db: Session,
+    claims: dict,
+    user_agent: str | None = None,
+    ip_address: str | None = None,
+) -> tuple[models.User, str]:
+    """
+    Exchange a refresh token for a new one in the same family.
+
+    The session (and its user, joined) is fetched by primary key. Presenting a
+    token that was already rotated or revoked means it leaked, so the whole
+    family is revoked and every device on that login must sign in again.
+    The row is claimed with a conditional UPDATE, so of two concurrent
+    replays of one token only the first gets a new one.
+    """
+    session = db.get(models.RefreshSession, claims.get("jti") or "")
+    if session is None or session.user.email != claims.get("sub"):
+        raise SessionError("Invalid refresh token")
+
+    family_id = session.family_id
+    if session.replaced_by is not None or session.revoked_at is not None:
+        _reuse_detected(db, family_id)
+
+    if (
+        session.expires_at <= _utcnow()
+        or not session.user.is_active
+        or claims.get("ver", 0) != session.user.token_version
+    ):
+        raise SessionError("Invalid refresh token")
+
+    token, replacement = issue_refresh_token(
+        db, session.user, user_agent, ip_address, family_id=family_id
+    )
+    claimed = db.execute(
+        update(models.RefreshSession)
+        .where(
+            models.RefreshSession.jti == session.jti,
+            models.RefreshSession.replaced_by.is_(None),
+            models.RefreshSession.revoked_at.is_(None),
+        )
+        .values(replaced_by=replacement.jti, last_used_at=_utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if claimed != 1:
+        # Another request rotated or revoked it since we read it
+        db.rollback()
+        _reuse_detected(db, family_id)
+
+    # Detached, the user isn't expired by the commit; callers only read its columns
+    user = session.user
+    db.expunge(user)
+    db.commit()
+    return user, token
+
+
+def _reuse_detected(db: Session, family_id: str) -> None:
+    revoke_family(db, family_id)
+    db.commit()
+    raise SessionError("Refresh token reuse detected")
+
+
+def revoke_all_tokens(db: Session, user: models.User) -> None:
+    """
+    Log the user out everywhere with one write: bump token_version so every
+    access and refresh token issued so far fails the "ver" check.
+    """
+    db.query(models.User).filter(models.User.id == user.id).update(
+        {models.User.token_version: models.User.token_version + 1},
+        synchronize_session=False,
+    )
+    db.commit()
+    invalidation.user_changed(user.email)
+
+
+async def revoke_all_tokens_async(db: AsyncSession, user: models.User) -> None:
+    """revoke_all_tokens for the async routes; the broadcast runs off the loop."""
+    await db.execute(
+        update(models.User)
+        .where(models.User.id == user.id)
+        .values(token_version=models.User.token_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    await asyncio.to_thread(invalidation.user_changed, user.email)
+
+
+def revoke_refresh_token(db: Session, refresh_token: str) -> None:
+    """Per-device logout: revoke the family of the given refresh token, if valid."""
+    try:
+        family_id = security.decode_token(refresh_token).get("fam")
+    except JWTError:
+        return
+    if family_id:
+        revoke_family(db, family_id)
+        db.commit()
+
+
+def active_sessions(db: Session, user_id: int) -> list[models.RefreshSession]:
+    """The live (latest, unrevoked, unexpired) session of each family."""
+    return (
+        db.query(models.RefreshSession)
+        .filter(
+            models.RefreshSession.user_id == user_id,
+            models.RefreshSession.replaced_by.is_(None),
+            models.RefreshSession.revoked_at.is_(None),
+            models.RefreshSession.expires_at > _utcnow(),
+        )
+        .order_by(models.RefreshSession.created_at.desc())
+        .all()
+    )
+
+
+def purge_expired_sessions(db: Session, batch_size: int, max_batches: int | None = None) -> int:
+    """
+    Delete sessions whose refresh token has expired, in batches of batch_size.
+
+    Rotated and revoked rows are only removed then: until its token expires,
+    a spent row is what lets a replay be recognised as reuse.
+    """
+    now = _utcnow()
+    deleted, batches = 0, 0
+    while max_batches is None or batches < max_batches:
+        jtis = [
+            jti for (jti,) in db.query(models.RefreshSession.jti)
+            .filter(models.RefreshSession.expires_at <= now)
+            .limit(batch_size)
+        ]
+        if not jtis:
+            break
+        db.execute(delete(models.RefreshSession).where(models.RefreshSession.jti.in_(jtis)))
+        db.commit()
+        deleted += len(jtis)
+        batches += 1
+    return deleted
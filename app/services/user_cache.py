@@ -0,0 +1,89 @@
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app import database, metrics, models
+from app.config import settings
+from app.services.cache import TTLCache
+
+# Keyed by the JWT "sub" claim (the user's email)
+user_cache = TTLCache(
+    max_size=settings.USER_CACHE_MAX_SIZE,
+    ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+)
+
+# Users changed within the replica lag window. Replicas may not have the
+# change yet, so these are read from the primary and not cached.
+recently_changed = TTLCache(
+    max_size=settings.USER_CACHE_MAX_SIZE,
+    ttl_seconds=settings.DATABASE_REPLICA_LAG_SECONDS,
+)
+
+
+def _snapshot(user: models.User) -> models.User:
+    """Detached copy of a loaded user, safe to share across sessions."""
+    columns = {attr.key: getattr(user, attr.key) for attr in inspect(models.User).column_attrs}
+    copy = models.User(**columns)
+    make_transient_to_detached(copy)
+    return copy
+
+
+def get_user_by_email(db: Session, email: str) -> models.User | None:
+    """
+    Return the user for a token subject, hitting the database only on a miss.
+
+    Cached users are merged into the request's session with load=False, so
+    callers still get a session-bound instance without any SQL being issued.
+    """
+    with metrics.stage("user_lookup"):
+        cached = user_cache.get(email)
+        if cached is not None:
+            return db.merge(cached, load=False)
+
+        if db.info.get("replica") and recently_changed.get(email):
+            return _from_primary(db, [email]).get(email)
+
+        user = db.query(models.User).filter(models.User.email == email).first()
+        if user is not None:
+            user_cache.set(email, _snapshot(user))
+        return user
+
+
+def _from_primary(db: Session, emails: list[str]) -> dict[str, models.User]:
+    primary = database.SessionLocal()
+    try:
+        snapshots = [
+            _snapshot(user)
+            for user in primary.query(models.User).filter(models.User.email.in_(emails))
+        ]
+    finally:
+        primary.close()
+    return {user.email: db.merge(user, load=False) for user in snapshots}
+
+
+def get_users_by_email(db: Session, emails: set[str]) -> dict[str, models.User]:
+    """Batch variant of get_user_by_email: one IN (...) query for all misses."""
+    users, missing, pinned = {}, [], []
+    replica = db.info.get("replica")
+    for email in emails:
+        cached = user_cache.get(email)
+        if cached is not None:
+            users[email] = db.merge(cached, load=False)
+        elif replica and recently_changed.get(email):
+            pinned.append(email)
+        else:
+            missing.append(email)
+
+    if pinned:
+        users.update(_from_primary(db, pinned))
+
+    if missing:
+        for user in db.query(models.User).filter(models.User.email.in_(missing)):
+            user_cache.set(user.email, _snapshot(user))
+            users[user.email] = user
+    return users
+
+
+def invalidate_user(email: str) -> None:
+    user_cache.invalidate(email)
+    if database.read_router.has_replicas:
+        recently_changed.set(email, True)
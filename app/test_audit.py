@@ -0,0 +1,69 @@
+import asyncio
+import json
+
+import pytest
+
+from app import models
+from app.config import settings
+from app.services import audit
+from app.services.audit import AuditLog
+
+
+@pytest.fixture
+def manual_flush(monkeypatch):
+    # Requested before `client` so the lifespan doesn't start the flusher
+    monkeypatch.setattr(settings, "AUDIT_FLUSH_SECONDS", 0)
+
+
+def test_auth_events_are_buffered_then_bulk_inserted(manual_flush, client, db, session_factory):
+    client.post("/auth/register", json={"email": "audited@example.com", "password": "AuditPass123"})
+    client.post("/auth/login", json={"email": "audited@example.com", "password": "WrongPass123"})
+    client.post("/auth/login", json={"email": "audited@example.com", "password": "AuditPass123"})
+
+    # Nothing is written by the requests themselves
+    assert db.query(models.AuditEvent).count() == 0
+    assert asyncio.run(audit.flush_audit(session_factory)) == 3
+
+    events = [(e.event, e.success) for e in db.query(models.AuditEvent).order_by(models.AuditEvent.id)]
+    assert events == [("register", True), ("login", False), ("login", True)]
+
+
+def test_full_buffer_drops_by_policy():
+    oldest = AuditLog(capacity=2, drop_policy="oldest")
+    newest = AuditLog(capacity=2, drop_policy="newest")
+    for name in ("a", "b", "c"):
+        oldest.record(name)
+        newest.record(name)
+
+    assert [e["event"] for e in oldest.drain(10)] == ["b", "c"]
+    assert [e["event"] for e in newest.drain(10)] == ["a", "b"]
+    assert oldest.stats()["dropped_total"] == newest.stats()["dropped_total"] == 1
+
+
+def test_file_sink_appends_jsonl(tmp_path, monkeypatch):
+    path = tmp_path / "audit.jsonl"
+    monkeypatch.setattr(settings, "AUDIT_SINK", "file")
+    monkeypatch.setattr(settings, "AUDIT_FILE_PATH", str(path))
+    audit.audit_log.clear()
+
+    audit.record("logout", email="file@example.com", user_id=7)
+    asyncio.run(audit.flush_audit())
+    audit.record("login", email="file@example.com", success=False)
+    asyncio.run(audit.flush_audit())
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(e["event"], e["success"]) for e in lines] == [("logout", True), ("login", False)]
+
+
+def test_failed_flush_requeues_and_counts(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "AUDIT_SINK", "file")
+    # A directory can't be opened for append, so every write fails
+    monkeypatch.setattr(settings, "AUDIT_FILE_PATH", str(tmp_path))
+    log = AuditLog(capacity=10)
+    monkeypatch.setattr(audit, "audit_log", log)
+
+    log.record("login", email="lost@example.com")
+    assert asyncio.run(audit.flush_audit()) == 0
+
+    stats = log.stats()
+    assert (stats["buffered"], stats["flushed_total"], stats["flush_failures_total"]) == (1, 0, 1)
@@ -1,3 +1,6 @@
+from app import models
+from app.security import hash_token
+
 def test_register_user(client):
     # 1. Try to register a user
     response = client.post(
@@ -56,4 +59,364 @@ def test_weak_password_rejection(client):
         json={"email": "weak@example.com", "password": "123"}
     )
     # Our Pydantic schema should reject passwords < 8 chars or without letters
-    assert response.status_code == 422 
\ No newline at end of file
+    assert response.status_code == 422 
+
+
+def test_logout_revokes_token(client, db):
+    client.post("/auth/register", json={"email": "bye@example.com", "password": "ByePass123"})
+    token = client.post(
+        "/auth/login", json={"email": "bye@example.com", "password": "ByePass123"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    assert client.post("/auth/logout", headers=headers).status_code == 200
+
+    # The revoked token is rejected
+    response = client.get("/users/me", headers=headers)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Token has been revoked"
+
+    # Only the digest is stored, not the token itself
+    revoked = db.query(models.RevokedToken).one()
+    assert revoked.token_hash == hash_token(token)
+
+def test_promote_invalidates_cached_user(client, db):
+    from app.security import hash_password
+    from app.services.user_cache import user_cache
+
+    db.add(models.User(email="boss@example.com", hashed_password=hash_password("BossPass123"), role="admin"))
+    db.commit()
+    client.post("/auth/register", json={"email": "worker@example.com", "password": "WorkPass123"})
+
+    def login(email, password):
+        token = client.post("/auth/login", json={"email": email, "password": password}).json()["access_token"]
+        return {"Authorization": f"Bearer {token}"}
+
+    worker = login("worker@example.com", "WorkPass123")
+    boss = login("boss@example.com", "BossPass123")
+
+    # Second lookup of the same subject is served from the cache
+    assert client.get("/users/me", headers=worker).json()["role"] == "user"
+    hits = user_cache.hits
+    assert client.get("/users/me", headers=worker).json()["role"] == "user"
+    assert user_cache.hits == hits + 1
+
+    worker_id = client.get("/users/me", headers=worker).json()["id"]
+    assert client.post(f"/users/promote/{worker_id}", headers=boss).status_code == 200
+
+    # Tokens minted under the old role are revoked; a fresh login carries the new one
+    response = client.get("/users/me", headers=worker)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Token has been revoked"
+    assert client.get("/users/me", headers=login("worker@example.com", "WorkPass123")).json()["role"] == "admin"
+
+def test_async_hashing_helpers():
+    import asyncio
+    from app import security
+
+    async def roundtrip():
+        hashed = await security.hash_password_async("AsyncPass123")
+        return (
+            await security.verify_password_async("AsyncPass123", hashed),
+            await security.verify_password_async("WrongPass123", hashed),
+        )
+
+    assert asyncio.run(roundtrip()) == (True, False)
+
+def test_me_answers_while_hashing_is_saturated(client, monkeypatch):
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    import anyio.to_thread
+    from app import security
+
+    client.post("/auth/register", json={"email": "busy@example.com", "password": "BusyPass123"})
+    token = client.post(
+        "/auth/login", json={"email": "busy@example.com", "password": "BusyPass123"}
+    ).json()["access_token"]
+
+    # Every hash blocks until released; a tiny threadpool makes starvation certain
+    release = threading.Event()
+    monkeypatch.setattr(security, "hash_password", lambda password: release.wait(10) and "x")
+
+    def set_threadpool_size(size):
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        previous, limiter.total_tokens = limiter.total_tokens, size
+        return previous
+
+    previous = client.portal.call(set_threadpool_size, 2)
+    pending = 6
+    with ThreadPoolExecutor(max_workers=pending + 1) as pool:
+        try:
+            registrations = [
+                pool.submit(client.post, "/auth/register",
+                            json={"email": f"burst{i}@example.com", "password": "BurstPass123"})
+                for i in range(pending)
+            ]
+            deadline = time.monotonic() + 5
+            while security.hash_admission.in_flight < pending and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert security.hash_admission.in_flight == pending
+
+            me = pool.submit(client.get, "/users/me", headers={"Authorization": f"Bearer {token}"})
+            assert me.result(timeout=5).status_code == 200
+        finally:
+            release.set()
+            client.portal.call(set_threadpool_size, previous)
+        assert [r.result(timeout=10).status_code for r in registrations] == [200] * pending
+
+def test_batch_introspection(client, monkeypatch):
+    from datetime import timedelta
+    from app.config import settings
+    from app.security import create_access_token, create_refresh_token
+
+    client.post("/auth/register", json={"email": "gate@example.com", "password": "GatePass123"})
+    active = client.post(
+        "/auth/login", json={"email": "gate@example.com", "password": "GatePass123"}
+    ).json()["access_token"]
+    revoked = create_access_token({"sub": "gate@example.com", "role": "user", "n": 1})
+    client.post("/auth/logout", headers={"Authorization": f"Bearer {revoked}"})
+    expired = create_access_token({"sub": "gate@example.com"}, timedelta(minutes=-1))
+    refresh = create_refresh_token({"sub": "gate@example.com"})
+    tokens = {"tokens": [active, revoked, expired, "not-a-jwt", refresh]}
+
+    # No secret configured: closed to anonymous callers and non-admins
+    assert client.post("/auth/introspect", json=tokens).status_code == 401
+    assert client.post(
+        "/auth/introspect", json=tokens, headers={"Authorization": f"Bearer {active}"}
+    ).status_code == 403
+
+    monkeypatch.setattr(settings, "INTROSPECTION_SECRET", "gateway-secret")
+    assert client.post(
+        "/auth/introspect", json=tokens, headers={"X-Introspection-Secret": "wrong"}
+    ).status_code == 401
+    response = client.post(
+        "/auth/introspect", json=tokens, headers={"X-Introspection-Secret": "gateway-secret"}
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == ["active", "revoked", "expired", "invalid", "invalid"]
+    assert results[0]["active"] is True
+    assert results[0]["role"] == "user"
+    assert results[0]["claims"]["sub"] == "gate@example.com"
+
+def test_purge_expired_revocations(db):
+    from datetime import datetime, timedelta
+    from app.services.revocation import purge_expired_revocations
+
+    now = datetime.utcnow()
+    for i in range(5):
+        db.add(models.RevokedToken(token_hash=f"{i:064x}", expires_at=now - timedelta(minutes=1)))
+    db.add(models.RevokedToken(token_hash="f" * 64, expires_at=now + timedelta(minutes=15)))
+    db.commit()
+
+    # Small batches still remove every expired row and keep the live one
+    assert purge_expired_revocations(db, batch_size=2) == 5
+    assert [r.token_hash for r in db.query(models.RevokedToken)] == ["f" * 64]
+
+def test_login_rehashes_stale_password_hash(client, db):
+    from passlib.hash import bcrypt
+    from app import security
+
+    db.add(models.User(email="stale@example.com", hashed_password=bcrypt.using(rounds=4).hash("StalePass123")))
+    db.commit()
+
+    security.configure_password_hashing(bcrypt_rounds=5)
+    try:
+        response = client.post("/auth/login", json={"email": "stale@example.com", "password": "StalePass123"})
+        assert response.status_code == 200
+    finally:
+        security.configure_password_hashing()
+
+    user = db.query(models.User).filter(models.User.email == "stale@example.com").one()
+    assert user.hashed_password.startswith("$2b$05$")
+    assert security.verify_password("StalePass123", user.hashed_password)
+
+
+def test_bcrypt_calibration_respects_floor():
+    from app.security import calibrate_bcrypt_rounds
+
+    # A tiny target can't go below the floor; a generous one goes above it
+    assert calibrate_bcrypt_rounds(target_ms=0.001, min_rounds=4) == 4
+    assert calibrate_bcrypt_rounds(target_ms=50, min_rounds=4) > 4
+
+def test_bcrypt_calibration_never_undercuts_configured_rounds(monkeypatch):
+    from app.config import settings
+    from app.security import calibrate_bcrypt_rounds
+
+    monkeypatch.setattr(settings, "BCRYPT_ROUNDS", 6)
+    assert calibrate_bcrypt_rounds(target_ms=0.001, min_rounds=4) == 6
+
+def test_refresh_rotation_detects_reuse(client, db):
+    client.post("/auth/register", json={"email": "rotate@example.com", "password": "RotatePass123"})
+    client.post("/auth/login", json={"email": "rotate@example.com", "password": "RotatePass123"})
+    first = client.cookies.get("refresh_token")
+
+    # Each refresh spends the cookie and sets a new one
+    assert client.post("/auth/refresh").status_code == 200
+    second = client.cookies.get("refresh_token")
+    assert second != first
+    assert client.post("/auth/refresh").status_code == 200
+
+    # Replaying a spent token revokes the whole family, latest token included
+    client.cookies.set("refresh_token", first)
+    response = client.post("/auth/refresh")
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Refresh token reuse detected"
+    assert db.query(models.RefreshSession).filter(models.RefreshSession.revoked_at.is_(None)).count() == 0
+
+def test_concurrent_refresh_replay_gets_one_token(client, db, session_factory):
+    import pytest
+    from app import security
+    from app.services import sessions
+
+    client.post("/auth/register", json={"email": "race@example.com", "password": "RacePass123"})
+    user = db.query(models.User).filter(models.User.email == "race@example.com").one()
+    token, _ = sessions.issue_refresh_token(db, user)
+    db.commit()
+    claims = security.decode_token(token)
+
+    # Both requests read the row while it is still unspent...
+    first, second = session_factory(), session_factory()
+    try:
+        # (held, so the identity map keeps them rather than re-reading)
+        loaded = [session.get(models.RefreshSession, claims["jti"]) for session in (first, second)]
+        assert [row.replaced_by for row in loaded] == [None, None]
+
+        # ...but only one can claim it; the loser is treated as reuse
+        sessions.rotate_refresh_token(first, claims)
+        with pytest.raises(sessions.SessionError, match="reuse detected"):
+            sessions.rotate_refresh_token(second, claims)
+    finally:
+        first.close()
+        second.close()
+
+    db.expire_all()
+    assert db.query(models.RefreshSession).count() == 2
+    assert db.query(models.RefreshSession).filter(models.RefreshSession.revoked_at.is_(None)).count() == 0
+
+def test_purge_expired_sessions(db):
+    from datetime import datetime, timedelta
+    from app.services.sessions import purge_expired_sessions
+
+    db.add(models.User(id=1, email="old@example.com", hashed_password="x"))
+    now = datetime.utcnow()
+    for i in range(3):
+        db.add(models.RefreshSession(jti=f"{i:032x}", family_id="f" * 32, user_id=1,
+                                     expires_at=now - timedelta(days=1), replaced_by=f"{i + 1:032x}"))
+    db.add(models.RefreshSession(jti="a" * 32, family_id="f" * 32, user_id=1, expires_at=now + timedelta(days=1)))
+    db.commit()
+
+    assert purge_expired_sessions(db, batch_size=2) == 3
+    assert [s.jti for s in db.query(models.RefreshSession)] == ["a" * 32]
+
+def test_list_and_revoke_sessions(client):
+    client.post("/auth/register", json={"email": "devices@example.com", "password": "DevicePass123"})
+
+    def login(user_agent):
+        response = client.post(
+            "/auth/login",
+            json={"email": "devices@example.com", "password": "DevicePass123"},
+            headers={"User-Agent": user_agent},
+        )
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    login("laptop")
+    headers = login("phone")
+
+    listed = client.get("/auth/sessions", headers=headers).json()
+    assert sorted(s["user_agent"] for s in listed) == ["laptop", "phone"]
+    assert [s["user_agent"] for s in listed if s["current"]] == ["phone"]
+
+    laptop = next(s["id"] for s in listed if s["user_agent"] == "laptop")
+    assert client.delete(f"/auth/sessions/{laptop}", headers=headers).status_code == 200
+    assert [s["user_agent"] for s in client.get("/auth/sessions", headers=headers).json()] == ["phone"]
+
+def test_logout_all_and_reset_invalidate_every_token(client, db):
+    from app.security import create_password_reset_token
+
+    client.post("/auth/register", json={"email": "everywhere@example.com", "password": "EveryPass123"})
+
+    def login(password):
+        response = client.post("/auth/login", json={"email": "everywhere@example.com", "password": password})
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    laptop, phone = login("EveryPass123"), login("EveryPass123")
+    assert client.post("/auth/logout-all", headers=laptop).status_code == 200
+
+    # Both devices are out and nothing was added to the revocation list
+    assert client.get("/users/me", headers=phone).json()["detail"] == "Token has been revoked"
+    assert client.post("/auth/refresh").status_code == 401
+    assert db.query(models.RevokedToken).count() == 0
+
+    # A password reset does the same, and its link can't be replayed
+    headers = login("EveryPass123")
+    reset = create_password_reset_token({"sub": "everywhere@example.com", "ver": 1})
+    body = {"token": reset, "new_password": "NewEveryPass123"}
+    assert client.post("/auth/reset-password", json=body).status_code == 200
+    assert client.get("/users/me", headers=headers).status_code == 401
+    assert client.post("/auth/reset-password", json=body).status_code == 400
+    assert client.get("/users/me", headers=login("NewEveryPass123")).status_code == 200
+
+def test_claims_cache_skips_repeat_decodes(client):
+    from app.security import hash_token
+    from app.services.claims_cache import claims_cache
+
+    client.post("/auth/register", json={"email": "claims@example.com", "password": "ClaimsPass123"})
+    token = client.post(
+        "/auth/login", json={"email": "claims@example.com", "password": "ClaimsPass123"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    client.get("/users/me", headers=headers)
+    hits = claims_cache.hits
+    client.get("/users/me", headers=headers)
+    assert claims_cache.hits == hits + 1
+
+    # Revocation drops the cached claims
+    client.post("/auth/logout", headers=headers)
+    assert claims_cache.get(hash_token(token)) is None
+
+def test_stateless_claims_skip_the_user_lookup(client, db, monkeypatch):
+    from sqlalchemy import event
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "STATELESS_CLAIMS", True)
+    client.post("/auth/register", json={"email": "claims-only@example.com", "password": "ClaimsOnly123"})
+    token = client.post(
+        "/auth/login", json={"email": "claims-only@example.com", "password": "ClaimsOnly123"}
+    ).json()["access_token"]
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.get_bind(), "before_cursor_execute", listener)
+    try:
+        response = client.get("/users/me", headers={"Authorization": f"Bearer {token}"})
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", listener)
+
+    assert response.status_code == 200
+    assert response.json()["email"] == "claims-only@example.com"
+    assert response.json()["id"] > 0
+    assert statements == []
+
+def test_deactivated_user_cannot_log_in_or_use_tokens(client, db):
+    from app.services.invalidation import user_changed
+
+    credentials = {"email": "gone@example.com", "password": "GonePass123"}
+    client.post("/auth/register", json=credentials)
+    token = client.post("/auth/login", json=credentials).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/users/me", headers=headers).status_code == 200
+
+    user = db.query(models.User).filter_by(email="gone@example.com").one()
+    user.is_active = False
+    db.commit()
+    user_changed("gone@example.com")
+
+    response = client.get("/users/me", headers=headers)
+    assert response.status_code == 403
+    assert response.json()["detail"] == "Account is disabled"
+    assert client.post("/auth/login", json=credentials).status_code == 403
+    # A wrong password still gets the generic answer
+    assert client.post("/auth/login", json={**credentials, "password": "WrongPass123"}).status_code == 401
@@ -0,0 +1,47 @@
+import hashlib
+
+import pytest
+
+from app.services import breached_passwords
+from app.services.breached_passwords import BreachedPasswordIndex, build_index, parse_digest
+
+BREACHED = ["Password123", "Qwerty1234", "Summer2024"]
+
+
+@pytest.fixture
+def index(tmp_path):
+    lines = [hashlib.sha1(p.encode()).hexdigest().upper() + ":42" for p in BREACHED]
+    # Tiny runs force the external merge, and duplicates must collapse
+    digests = [parse_digest(line) for line in lines + lines]
+    assert build_index(digests, str(tmp_path / "pwned.idx"), chunk_records=2) == len(BREACHED)
+
+    index = BreachedPasswordIndex(str(tmp_path / "pwned.idx"))
+    breached_passwords.set_index(index)
+    yield index
+    breached_passwords.set_index(None)
+    index.close()
+
+
+def test_index_lookup(index):
+    assert len(index) == 3
+    assert all(index.is_breached(p) for p in BREACHED)
+    assert not index.is_breached("NotInTheCorpus99")
+
+
+def test_index_rejects_other_files(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_bytes(b"not an index" * 100)
+    with pytest.raises(ValueError):
+        BreachedPasswordIndex(str(path))
+
+
+def test_register_and_reset_reject_breached_passwords(client, index):
+    from app.security import create_password_reset_token
+
+    response = client.post("/auth/register", json={"email": "pwned@example.com", "password": "Password123"})
+    assert response.status_code == 422
+
+    assert client.post("/auth/register", json={"email": "pwned@example.com", "password": "Unique4Me99"}).status_code == 200
+    reset = create_password_reset_token({"sub": "pwned@example.com"})
+    response = client.post("/auth/reset-password", json={"token": reset, "new_password": "Summer2024"})
+    assert response.status_code == 400
@@ -0,0 +1,177 @@
+import asyncio
+
+from sqlalchemy import text
+
+from app import database
+from app.dependencies import get_async_db
+
+
+def test_async_database_url_mapping():
+    assert database.async_database_url("sqlite:///./app.db") == "sqlite+aiosqlite:///./app.db"
+    assert (
+        database.async_database_url("postgresql://u:p@db/auth")
+        == "postgresql+asyncpg://u:p@db/auth"
+    )
+
+
+def test_async_session_and_pool_wait_stats():
+    async def run_query():
+        dependency = get_async_db()
+        db = await anext(dependency)
+        try:
+            return (await db.execute(text("SELECT 1"))).scalar()
+        finally:
+            await dependency.aclose()
+            await database.dispose_async_engine()
+
+    before = database.pool_wait_stats.snapshot()["checkouts"]
+    assert asyncio.run(run_query()) == 1
+    assert database.pool_wait_stats.snapshot()["checkouts"] > before
+
+
+def _replica(path, role):
+    from sqlalchemy.orm import sessionmaker
+    from app import models
+
+    url = f"sqlite:///{path}"
+    engine = database.create_engine(url)
+    database.Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add(models.User(email="lag@example.com", hashed_password="x", role=role))
+        db.commit()
+    engine.dispose()
+    return url
+
+
+def test_read_router_round_robins_replicas(tmp_path):
+    from app import models
+
+    router = database.ReadRouter([_replica(tmp_path / "a.db", "a"), _replica(tmp_path / "b.db", "b")])
+    roles = []
+    for _ in range(4):
+        with router.session() as db:
+            assert db.info["replica"]
+            roles.append(db.query(models.User).one().role)
+    assert roles == ["a", "b", "a", "b"]
+
+    # Without replicas, reads go to the primary
+    assert not database.ReadRouter([]).session().info.get("replica")
+
+
+def test_read_db_uses_the_primary_in_writing_routes_whatever_the_order(tmp_path, monkeypatch):
+    from fastapi import APIRouter, Depends
+    from starlette.datastructures import State
+    from types import SimpleNamespace
+    from app.dependencies import get_db, get_read_db
+
+    router = APIRouter()
+
+    # get_read_db resolves before get_db here
+    @router.post("/write")
+    def write(reads=Depends(get_read_db), db=Depends(get_db)):
+        pass
+
+    @router.get("/read")
+    def read(reads=Depends(get_read_db)):
+        pass
+
+    monkeypatch.setattr(database, "read_router", database.ReadRouter([_replica(tmp_path / "r.db", "user")]))
+    write_route, read_route = router.routes
+
+    request = SimpleNamespace(state=State(), scope={"route": write_route})
+    reads = get_read_db(request)
+    db = next(reads)
+    primary = get_db(request)
+    assert next(primary) is db
+    assert not db.info.get("replica")
+    reads.close()
+    primary.close()
+
+    reads = get_read_db(SimpleNamespace(state=State(), scope={"route": read_route}))
+    assert next(reads).info["replica"]
+    reads.close()
+
+
+def test_replica_engines_are_built_on_first_use(tmp_path):
+    router = database.ReadRouter([_replica(tmp_path / "lazy.db", "user")])
+    assert router.has_replicas and router._engines is None
+    with router.session() as db:
+        assert db.info["replica"]
+    assert len(router.engines) == 1
+
+
+def test_recently_changed_users_are_read_from_the_primary(tmp_path, db, session_factory, monkeypatch):
+    from app import models
+    from app.services import user_cache
+
+    router = database.ReadRouter([_replica(tmp_path / "stale.db", "user")])
+    monkeypatch.setattr(database, "read_router", router)
+    monkeypatch.setattr(database, "SessionLocal", session_factory)
+    user_cache.user_cache.clear()
+
+    # The primary has the promotion; the replica hasn't caught up yet
+    db.add(models.User(email="lag@example.com", hashed_password="x", role="admin"))
+    db.commit()
+    user_cache.invalidate_user("lag@example.com")
+
+    with router.session() as replica:
+        assert user_cache.get_user_by_email(replica, "lag@example.com").role == "admin"
+    assert user_cache.user_cache.get("lag@example.com") is None
+    user_cache.recently_changed.clear()
+
+
+def test_schema_check_creates_once_then_only_reads_the_version(tmp_path):
+    from sqlalchemy import event
+
+    engine = database.create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    assert database.ensure_schema(engine) is True
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    assert database.ensure_schema(engine) is False
+    assert len(statements) == 1
+    engine.dispose()
+
+
+def test_schema_check_reports_missing_columns(tmp_path):
+    import pytest
+
+    engine = database.create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        # A users table from before token_version existed
+        conn.execute(text(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR, hashed_password VARCHAR, "
+            "is_active BOOLEAN, role VARCHAR)"
+        ))
+    with pytest.raises(RuntimeError, match="users.token_version"):
+        database.ensure_schema(engine)
+    engine.dispose()
+
+
+def test_schema_check_rebuilds_legacy_revoked_tokens(tmp_path):
+    import time
+    from jose import jwt
+    from app.security import hash_token
+
+    live = jwt.encode({"sub": "a@example.com", "exp": int(time.time()) + 600}, "k")
+    expired = jwt.encode({"sub": "b@example.com", "exp": int(time.time()) - 600}, "k")
+    engine = database.create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        # revoked_tokens from before tokens were stored hashed
+        conn.execute(text(
+            "CREATE TABLE revoked_tokens (id INTEGER PRIMARY KEY, token VARCHAR NOT NULL UNIQUE, "
+            "revoked_at DATETIME)"
+        ))
+        for token in (live, expired, "not-a-jwt"):
+            conn.execute(text("INSERT INTO revoked_tokens (token) VALUES (:t)"), {"t": token})
+
+    assert database.ensure_schema(engine) is True
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT token_hash, expires_at FROM revoked_tokens")).all()
+        assert [row.token_hash for row in rows] == [hash_token(live)]
+        # New revocations insert again
+        conn.execute(text(
+            "INSERT INTO revoked_tokens (token_hash, expires_at, revoked_at) "
+            "VALUES ('x', '2030-01-01', '2026-01-01')"
+        ))
+    engine.dispose()
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+from passlib.hash import bcrypt
+
+import import_users
+from app import models
+from app.security import verify_password
+
+# Cheap but valid; imported as-is rather than rehashed
+EXISTING_HASH = bcrypt.using(rounds=4).hash("Migrated123")
+
+
+@pytest.fixture
+def run_import(session_factory, monkeypatch, capsys):
+    # The script opens its own session; point it at the test database
+    monkeypatch.setattr(import_users, "SessionLocal", session_factory)
+    monkeypatch.setattr(import_users, "engine", session_factory.kw["bind"])
+
+    def run(path, fmt, on_conflict="skip"):
+        import_users.import_users(str(path), fmt, batch_size=2, workers=1,
+                                  on_conflict=on_conflict, default_role="user")
+        return capsys.readouterr().out
+
+    return run
+
+
+def _users(db):
+    db.expire_all()
+    return {u.email: u for u in db.query(models.User)}
+
+
+def test_csv_import(run_import, db, tmp_path):
+    path = tmp_path / "users.csv"
+    path.write_text(
+        "email,password,hashed_password,role,is_active\n"
+        "plain@example.com,PlainPass123,,,\n"
+        f"hashed@example.com,,{EXISTING_HASH},admin,false\n"
+        "not-an-email,Whatever123,,,\n"
+        "nopassword@example.com,,,,\n"
+    )
+
+    out = run_import(path, "csv")
+
+    users = _users(db)
+    assert set(users) == {"plain@example.com", "hashed@example.com"}
+    # Blank cells take the defaults
+    assert users["plain@example.com"].is_active is True
+    assert users["plain@example.com"].role == "user"
+    assert verify_password("PlainPass123", users["plain@example.com"].hashed_password)
+    assert users["hashed@example.com"].hashed_password == EXISTING_HASH
+    assert users["hashed@example.com"].is_active is False
+    assert users["hashed@example.com"].role == "admin"
+    assert "Rejected: 2" in out
+
+
+def _write_jsonl(path, rows):
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows))
+
+
+def test_jsonl_import_skips_or_updates_existing(run_import, db, tmp_path):
+    db.add(models.User(email="taken@example.com", hashed_password="old", role="user"))
+    db.commit()
+    path = tmp_path / "users.jsonl"
+    _write_jsonl(path, [
+        {"email": "taken@example.com", "hashed_password": EXISTING_HASH, "role": "admin", "is_active": None},
+        {"email": "fresh@example.com", "hashed_password": EXISTING_HASH},
+    ])
+
+    out = run_import(path, "jsonl")
+    users = _users(db)
+    assert users["taken@example.com"].hashed_password == "old"
+    assert users["fresh@example.com"].is_active is True
+    assert "Skipped (duplicate or existing email): 1" in out
+
+    run_import(path, "jsonl", on_conflict="update")
+    taken = _users(db)["taken@example.com"]
+    assert taken.hashed_password == EXISTING_HASH
+    assert taken.role == "admin"
+    assert taken.is_active is True
@@ -0,0 +1,179 @@
+import asyncio
+import json
+
+import asyncpg
+import pytest
+
+from app import database
+from app.services import invalidation
+from app.services.revocation import revocation_cache
+from app.services.user_cache import user_cache
+
+
+def test_write_paths_broadcast_to_other_workers(client, monkeypatch):
+    bus = invalidation.InMemoryBackend()
+    received = []
+    bus.subscribers.append(lambda message: received.append(json.loads(message)))
+    monkeypatch.setattr(invalidation, "backend", bus)
+
+    client.post("/auth/register", json={"email": "peer@example.com", "password": "PeerPass123"})
+    token = client.post(
+        "/auth/login", json={"email": "peer@example.com", "password": "PeerPass123"}
+    ).json()["access_token"]
+    client.post("/auth/logout", headers={"Authorization": f"Bearer {token}"})
+
+    kinds = [(event["kind"], event["origin"]) for event in received]
+    assert ("user", invalidation.ORIGIN) in kinds
+    assert ("token_revoked", invalidation.ORIGIN) in kinds
+
+
+def test_events_from_other_workers_are_applied(client):
+    user_cache.set("stale@example.com", object())
+
+    # Our own echo is ignored; it was applied when published
+    invalidation.handle_message(json.dumps(
+        {"kind": "user", "email": "stale@example.com", "origin": invalidation.ORIGIN}
+    ))
+    assert user_cache.get("stale@example.com") is not None
+
+    invalidation.handle_message(json.dumps(
+        {"kind": "user", "email": "stale@example.com", "origin": "other-worker"}
+    ))
+    invalidation.handle_message(json.dumps(
+        {"kind": "token_revoked", "token_hash": "a" * 64, "expires_at": 4_000_000_000, "origin": "other-worker"}
+    ))
+    assert user_cache.get("stale@example.com") is None
+    assert revocation_cache.is_revoked(None, "a" * 64)
+
+    # Garbage on the channel doesn't take the listener down
+    invalidation.handle_message("not json")
+
+
+def test_backends_must_implement_publish_and_listen():
+    class PublishOnly(invalidation.InvalidationBackend):
+        def publish(self, message):
+            pass
+
+    with pytest.raises(TypeError):
+        PublishOnly()
+
+
+class FakePubSub:
+    def __init__(self, messages):
+        self.messages = messages
+        self.channels = []
+        self.closed = False
+
+    async def subscribe(self, channel):
+        self.channels.append(channel)
+
+    async def listen(self):
+        for data in self.messages:
+            yield {"type": "message", "data": data}
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FakeRedis:
+    """The parts of redis.Redis / redis.asyncio.Redis the backend uses."""
+
+    def __init__(self, messages=()):
+        self.published = []
+        self.pubsub_ = FakePubSub(list(messages))
+        self.closed = False
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return self.pubsub_
+
+    async def aclose(self):
+        self.closed = True
+
+
+def test_redis_backend_publishes_and_listens(monkeypatch):
+    sync_client, async_client = FakeRedis(), FakeRedis([b'{"kind": "user"}'])
+    backend = invalidation.RedisBackend("redis://cache:6379/0", "auth-events", client=sync_client)
+    monkeypatch.setattr(backend, "_listen_client", lambda: async_client)
+
+    backend.publish("hello")
+    assert sync_client.published == [("auth-events", "hello")]
+
+    received, connects = [], []
+
+    async def on_connect():
+        connects.append(True)
+
+    asyncio.run(backend.listen(received.append, on_connect))
+    assert async_client.pubsub_.channels == ["auth-events"]
+    assert connects == [True]
+    assert received == ['{"kind": "user"}']
+    assert async_client.pubsub_.closed and async_client.closed
+
+
+class FakeEngine:
+    """engine.begin() hands out one recording connection."""
+
+    def __init__(self):
+        self.executed = []
+
+    def begin(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params):
+        self.executed.append((str(statement), params))
+
+
+class FakeAsyncpgConnection:
+    def __init__(self):
+        self.listeners = {}
+        self.on_terminate = None
+        self.closed = False
+
+    def add_termination_listener(self, callback):
+        self.on_terminate = callback
+
+    async def add_listener(self, channel, callback):
+        self.listeners[channel] = callback
+
+    async def close(self):
+        self.closed = True
+
+
+def test_postgres_backend_notifies_and_listens(monkeypatch):
+    notify = FakeEngine()
+    monkeypatch.setattr(database, "get_engine", lambda: notify)
+    listen_conn = FakeAsyncpgConnection()
+    connected_to = []
+
+    async def connect(url):
+        connected_to.append(url)
+        return listen_conn
+
+    monkeypatch.setattr(asyncpg, "connect", connect)
+    backend = invalidation.PostgresBackend("postgresql+psycopg2://u:p@db/auth", "auth_events")
+
+    backend.publish("hello")
+    assert notify.executed == [("SELECT pg_notify(:channel, :message)", {"channel": "auth_events", "message": "hello"})]
+
+    received = []
+
+    async def on_connect():
+        # Deliver one notification, then drop the connection
+        listen_conn.listeners["auth_events"](listen_conn, 1, "auth_events", "payload")
+        listen_conn.on_terminate(listen_conn)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(backend.listen(received.append, on_connect))
+    # The SQLAlchemy driver suffix is dropped for asyncpg
+    assert connected_to == ["postgresql://u:p@db/auth"]
+    assert received == ["payload"]
+    assert listen_conn.closed
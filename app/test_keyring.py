@@ -0,0 +1,74 @@
+import time
+
+import pytest
+from jose import JWTError, jwt
+
+from app.config import settings
+from app.keyring import KeyRing
+
+
+def test_rotated_key_is_published_before_it_signs(tmp_path):
+    keyring = KeyRing(str(tmp_path), "ES256", size=2)
+    keyring.load()
+
+    old_token = keyring.sign({"sub": "rotate@example.com"})
+    old_kid = jwt.get_unverified_header(old_token)["kid"]
+
+    # Verifiers holding a cached JWKS must learn the key before it signs
+    pending_kid = keyring.rotate()
+    assert {key["kid"] for key in keyring.jwks()["keys"]} == {old_kid, pending_kid}
+    assert jwt.get_unverified_header(keyring.sign({"sub": "x"}))["kid"] == old_kid
+
+    # An immediate rotation (leaked key) signs at once; older tokens still verify
+    new_kid = keyring.rotate(activate_in=0)
+    new_token = keyring.sign({"sub": "rotate@example.com"})
+    assert jwt.get_unverified_header(new_token)["kid"] == new_kid
+    assert keyring.decode(old_token)["sub"] == "rotate@example.com"
+    assert keyring.decode(new_token)["sub"] == "rotate@example.com"
+
+
+def test_retired_keys_are_kept_until_their_tokens_expire(tmp_path):
+    keyring = KeyRing(str(tmp_path), "ES256", size=1)
+    expired_retirement = time.time() - (settings.REFRESH_TOKEN_EXPIRE_DAYS + 1) * 24 * 60 * 60
+    oldest = keyring._write_new_key(expired_retirement - 60)
+    keyring._write_new_key(expired_retirement)
+    keyring.load()
+    token = keyring.sign({"sub": "retired@example.com"})
+
+    # Two quick rotations: the key that signed `token` retires but stays
+    keyring.rotate(activate_in=0)
+    keyring.rotate(activate_in=0)
+    assert keyring.decode(token)["sub"] == "retired@example.com"
+    # Its predecessor retired more than a refresh-token lifetime ago
+    assert oldest not in {path.stem for path in tmp_path.glob("*.pem")}
+    with pytest.raises(JWTError):
+        keyring.decode(jwt.encode({"sub": "x"}, "k", headers={"kid": oldest}))
+
+
+def test_jwks_endpoint_is_cacheable(client):
+    response = client.get("/.well-known/jwks.json")
+    assert response.status_code == 200
+    assert "max-age" in response.headers["Cache-Control"]
+    assert "keys" in response.json()
+
+
+def test_workers_booting_together_share_the_first_key(tmp_path):
+    import threading
+
+    keyrings = [KeyRing(str(tmp_path), "ES256") for _ in range(4)]
+    start = threading.Barrier(len(keyrings))
+
+    def boot(keyring):
+        start.wait()
+        keyring.load()
+
+    threads = [threading.Thread(target=boot, args=(k,)) for k in keyrings]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # One key on disk, and a token from any worker verifies on every other
+    assert len(list(tmp_path.glob("*.pem"))) == 1
+    token = keyrings[0].sign({"sub": "boot@example.com"})
+    assert all(k.decode(token)["sub"] == "boot@example.com" for k in keyrings)
@@ -0,0 +1,24 @@
+from app.config import settings
+
+
+def test_metrics_report_routes_stages_and_queries(client, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-secret")
+    client.post("/auth/register", json={"email": "metrics@example.com", "password": "Metrics123"})
+    token = client.post(
+        "/auth/login", json={"email": "metrics@example.com", "password": "Metrics123"}
+    ).json()["access_token"]
+    client.get("/users/me", headers={"Authorization": f"Bearer {token}"})
+
+    # Not public: the scraper authenticates with METRICS_TOKEN
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer guess"}).status_code == 403
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
+    body = response.text
+
+    assert 'http_requests_total{method="GET",route="/users/me",status="200"}' in body
+    assert 'http_request_duration_seconds_count{method="POST",route="/auth/login"}' in body
+    for stage in ("revocation_lookup", "jwt_decode", "user_lookup", "bcrypt_hash", "bcrypt_verify"):
+        assert f'auth_stage_duration_seconds_count{{stage="{stage}"}}' in body
+    assert 'db_queries_per_request_count{route="/auth/register"}' in body
+    assert 'db_pool{stat="checkouts_total"}' in body
@@ -0,0 +1,114 @@
+import asyncio
+import socket
+
+import pytest
+from aiosmtpd.controller import Controller
+from fastapi_mail import ConnectionConfig
+
+from app import models
+from app.services.outbox import drain_outbox, purge_outbox, record_results
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _mail_config(port):
+    return ConnectionConfig(
+        MAIL_USERNAME="",
+        MAIL_PASSWORD="",
+        MAIL_FROM="noreply@example.com",
+        MAIL_PORT=port,
+        MAIL_SERVER="127.0.0.1",
+        MAIL_STARTTLS=False,
+        MAIL_SSL_TLS=False,
+        USE_CREDENTIALS=False,
+        VALIDATE_CERTS=False,
+    )
+
+
+@pytest.fixture
+def smtp_server():
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+
+def test_forgot_password_only_enqueues(client, db):
+    client.post("/auth/register", json={"email": "forgot@example.com", "password": "Forgot1234"})
+
+    response = client.post("/auth/forgot-password", json={"email": "forgot@example.com"})
+    assert response.status_code == 200
+
+    queued = db.query(models.EmailOutbox).one()
+    assert queued.recipient == "forgot@example.com"
+    assert queued.status == "pending"
+
+
+def test_outbox_batch_is_sent_over_smtp(db, session_factory, smtp_server):
+    controller, handler = smtp_server
+    for i in range(3):
+        db.add(models.EmailOutbox(recipient=f"user{i}@example.com", subject="Hi", body="<p>Hi</p>"))
+    db.commit()
+
+    sent = asyncio.run(drain_outbox(session_factory, _mail_config(controller.port)))
+
+    assert sent == 3
+    assert sorted(m.rcpt_tos[0] for m in handler.messages) == [
+        "user0@example.com", "user1@example.com", "user2@example.com"
+    ]
+    db.expire_all()
+    # Sent rows keep no copy of the message (and its reset link)
+    assert {(row.status, row.body) for row in db.query(models.EmailOutbox)} == {("sent", "")}
+
+
+def test_outbox_retries_with_backoff_when_smtp_is_down(db, session_factory):
+    db.add(models.EmailOutbox(recipient="retry@example.com", subject="Hi", body="<p>Hi</p>"))
+    db.commit()
+
+    sent = asyncio.run(drain_outbox(session_factory, _mail_config(_free_port())))
+
+    assert sent == 0
+    db.expire_all()
+    row = db.query(models.EmailOutbox).one()
+    assert row.status == "pending"
+    assert row.attempts == 1
+    assert row.last_error
+    assert row.next_attempt_at > row.created_at
+
+
+def test_failed_rows_are_blanked_and_old_rows_purged(db, monkeypatch):
+    from datetime import datetime, timedelta
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "OUTBOX_MAX_ATTEMPTS", 1)
+    old = datetime.utcnow() - timedelta(days=30)
+    db.add_all([
+        models.EmailOutbox(id=1, recipient="a@example.com", subject="Hi", body="<p>link</p>", created_at=old),
+        models.EmailOutbox(id=2, recipient="b@example.com", subject="Hi", body="<p>link</p>", created_at=old),
+        models.EmailOutbox(id=3, recipient="c@example.com", subject="Hi", body="<p>link</p>"),
+        models.EmailOutbox(id=4, recipient="d@example.com", subject="Hi", body="<p>link</p>", created_at=old),
+    ])
+    db.commit()
+    record_results(db, {1: None, 2: "550 mailbox unavailable", 3: None})
+
+    db.expire_all()
+    rows = {row.id: (row.status, row.body) for row in db.query(models.EmailOutbox)}
+    assert rows == {1: ("sent", ""), 2: ("failed", ""), 3: ("sent", ""), 4: ("pending", "<p>link</p>")}
+
+    # Old finished rows go; recent ones and anything still pending stay
+    assert purge_outbox(db, timedelta(days=7), batch_size=1) == 2
+    assert sorted(row.id for row in db.query(models.EmailOutbox)) == [3, 4]
@@ -0,0 +1,131 @@
+import os
+
+from fastapi.testclient import TestClient
+
+from app import models
+from app.config import settings
+from app.main import app
+from app.profiling import ProfilingMiddleware, StackSampler
+from app.security import create_access_token, hash_password
+from app.services.user_cache import user_cache
+
+
+def test_stack_sampler_collapses_other_threads():
+    import threading
+
+    done = threading.Event()
+
+    def spin():
+        while not done.is_set():
+            sum(range(1000))
+
+    worker = threading.Thread(target=spin, name="busy")
+    worker.start()
+    sampler = StackSampler(interval=0.001)
+    try:
+        sampler.sample()
+    finally:
+        done.set()
+        worker.join()
+
+    assert sampler.samples == 1
+    # "thread;outer frame;...;leaf frame count"
+    assert any(line.startswith("busy;") for line in sampler.collapsed().splitlines())
+
+
+def test_request_profile_leaves_out_other_threads():
+    import asyncio
+    import threading
+    import time
+    from app import profiling
+
+    stop = threading.Event()
+
+    def concurrent_request_work():
+        while not stop.is_set():
+            time.sleep(0.001)
+
+    def profiled_request_work():
+        while not stop.is_set():
+            time.sleep(0.001)
+
+    async def profile():
+        threads = profiling.RequestThreads()
+        marked = profiling._profiled_request.set(threads)
+        sampler = StackSampler(interval=0.001, include=threads)
+        sampler.start()
+        try:
+            work = asyncio.create_task(asyncio.to_thread(profiled_request_work))
+            await asyncio.sleep(0.1)
+        finally:
+            stop.set()
+            await work
+            profiling._profiled_request.reset(marked)
+            sampler.stop()
+        return sampler.collapsed()
+
+    other = threading.Thread(target=concurrent_request_work)
+    other.start()
+    try:
+        collapsed = asyncio.run(profile())
+    finally:
+        stop.set()
+        other.join()
+
+    assert "profiled_request_work" in collapsed
+    assert "concurrent_request_work" not in collapsed
+
+
+def test_only_admins_can_request_a_profile(client, db, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILING_DIR", str(tmp_path))
+    db.add(models.User(email="prof@example.com", hashed_password=hash_password("ProfPass123"), role="admin"))
+    db.commit()
+    admin = {"Authorization": "Bearer " + create_access_token({"sub": "prof@example.com", "role": "admin"})}
+    user = {"Authorization": "Bearer " + create_access_token({"sub": "prof@example.com", "role": "user"})}
+
+    # The middleware is only installed when PROFILING_ENABLED is set
+    profiled = TestClient(ProfilingMiddleware(app))
+    assert "x-profile-id" not in profiled.get("/", headers={**user, "X-Profile": "1"}).headers
+    assert "x-profile-id" not in profiled.get("/", headers=admin).headers
+
+    name = profiled.get("/users/me?profile=1", headers=admin).headers["x-profile-id"]
+    assert os.path.isfile(tmp_path / name)
+
+    listed = client.get("/users/admin/profiles", headers=admin).json()
+    assert listed == [name]
+    assert client.get(f"/users/admin/profiles/{name}", headers=admin).status_code == 200
+    assert client.get("/users/admin/profiles/..%2Fconftest.py", headers=admin).status_code == 404
+
+
+def test_profile_requests_recheck_the_admin_account(client, db):
+    from app.profiling import _is_admin_request
+
+    # `client` points the sessions opened outside requests at the test database
+    db.add(models.User(email="boss@example.com", hashed_password="x", role="admin"))
+    db.commit()
+    token = create_access_token({"sub": "boss@example.com", "role": "admin"})
+    headers = {b"authorization": f"Bearer {token}".encode()}
+    assert _is_admin_request(headers)
+
+    # Demoted, deactivated, or logged out everywhere: the old admin token no longer counts
+    user = db.query(models.User).one()
+    for change in ({"role": "user"}, {"is_active": False}, {"token_version": 1}):
+        user_cache.clear()
+        for key, value in {"role": "admin", "is_active": True, "token_version": 0, **change}.items():
+            setattr(user, key, value)
+        db.commit()
+        assert not _is_admin_request(headers), change
+
+
+def test_old_profiles_are_deleted_beyond_the_cap(tmp_path, monkeypatch):
+    from app.profiling import _write_profile
+
+    monkeypatch.setattr(settings, "PROFILING_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "PROFILING_MAX_FILES", 2)
+    for i in range(4):
+        _write_profile(f"2026010{i}T000000-GET-users-0000000{i}.collapsed", "main 1\n")
+
+    assert sorted(os.listdir(tmp_path)) == [
+        "20260102T000000-GET-users-00000002.collapsed",
+        "20260103T000000-GET-users-00000003.collapsed",
+    ]
@@ -0,0 +1,69 @@
+import pytest
+
+from app import models
+from app.security import hash_password
+
+# Wall-time budgets are loose enough for a slow CI box; the query counts are
+# the tight part. Login includes one bcrypt verification.
+
+
+def _login(client, email="budget@example.com", password="BudgetPass123"):
+    client.post("/auth/register", json={"email": email, "password": password})
+    response = client.post("/auth/login", json={"email": email, "password": password})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_login_budget(client, query_budget):
+    client.post("/auth/register", json={"email": "budget@example.com", "password": "BudgetPass123"})
+
+    # User lookup and the refresh session insert; nothing reloaded after commit
+    with query_budget(max_queries=2, max_seconds=2.0, label="POST /auth/login"):
+        response = client.post("/auth/login", json={"email": "budget@example.com", "password": "BudgetPass123"})
+    assert response.status_code == 200
+
+
+def test_me_budget(client, query_budget):
+    headers = _login(client)
+
+    with query_budget(max_queries=1, max_seconds=0.5, label="GET /users/me (cold)"):
+        assert client.get("/users/me", headers=headers).status_code == 200
+    with query_budget(max_queries=0, max_seconds=0.5, label="GET /users/me (cached)"):
+        assert client.get("/users/me", headers=headers).status_code == 200
+
+
+def test_refresh_and_logout_budgets(client, query_budget):
+    headers = _login(client)
+
+    # Session by primary key (user joined), mark it replaced, insert the new one
+    with query_budget(max_queries=3, max_seconds=0.5, label="POST /auth/refresh"):
+        assert client.post("/auth/refresh").status_code == 200
+
+    # Cold user lookup, the revocation insert and the refresh family update
+    with query_budget(max_queries=3, max_seconds=0.5, label="POST /auth/logout"):
+        assert client.post("/auth/logout", headers=headers).status_code == 200
+
+
+def test_list_users_budget_is_flat(client, db, query_budget):
+    db.add(models.User(email="admin@example.com", hashed_password=hash_password("AdminPass123"), role="admin"))
+    hashed = hash_password("Irrelevant1")
+    db.add_all(models.User(email=f"member{i}@example.com", hashed_password=hashed) for i in range(20))
+    db.commit()
+    headers = _login(client, "admin@example.com", "AdminPass123")
+
+    # Admin lookup plus one page query, however many rows come back
+    with query_budget(max_queries=2, max_seconds=0.5, label="GET /users"):
+        response = client.get("/users", params={"limit": 20}, headers=headers)
+    assert len(response.json()["items"]) == 20
+
+
+def test_budget_failure_lists_statements(client, query_budget):
+    _login(client)
+
+    with pytest.raises(pytest.fail.Exception) as exc:
+        with query_budget(max_queries=0, label="POST /auth/login"):
+            client.post("/auth/login", json={"email": "budget@example.com", "password": "BudgetPass123"})
+
+    message = str(exc.value)
+    assert "POST /auth/login over budget: 2 SQL statements (budget 0)" in message
+    assert "1. SELECT users.id" in message
+    assert "2. INSERT INTO refresh_sessions" in message
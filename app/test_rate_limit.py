@@ -0,0 +1,75 @@
+import pytest
+from fastapi import HTTPException
+
+from app.config import settings
+from app.services import rate_limit
+from app.services.rate_limit import InMemoryBackend, RateLimitBackend, RedisBackend
+
+
+def test_token_bucket_allows_burst_then_waits():
+    backend = InMemoryBackend()
+    assert backend.take("k", rate_per_second=1, burst=2) == 0
+    assert backend.take("k", rate_per_second=1, burst=2) == 0
+    assert 0 < backend.take("k", rate_per_second=1, burst=2) <= 1
+    # Other keys have their own bucket
+    assert backend.take("other", rate_per_second=1, burst=2) == 0
+
+
+def test_login_is_throttled_per_email(client, monkeypatch):
+    monkeypatch.setattr(settings, "LOGIN_EMAIL_BURST", 2)
+    monkeypatch.setattr(settings, "LOGIN_EMAIL_PER_MINUTE", 1)
+    client.post("/auth/register", json={"email": "target@example.com", "password": "Target1234"})
+
+    attempt = {"email": "target@example.com", "password": "WrongGuess1"}
+    assert client.post("/auth/login", json=attempt).status_code == 401
+    assert client.post("/auth/login", json=attempt).status_code == 401
+
+    response = client.post("/auth/login", json=attempt)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+
+
+def test_hashing_queue_full_returns_503(client, monkeypatch):
+    # A limit of zero in-flight hashes means every hashing request is shed
+    monkeypatch.setattr(settings, "HASH_MAX_QUEUE", -settings.HASH_EXECUTOR_WORKERS)
+
+    response = client.post("/auth/register", json={"email": "busy@example.com", "password": "BusyPass123"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(settings.HASH_RETRY_AFTER_SECONDS)
+
+
+class FakeRedis:
+    """Stands in for redis.Redis: records EVAL calls, answers from a script."""
+
+    def __init__(self, *replies):
+        self.calls = []
+        self.replies = list(replies)
+
+    def eval(self, script, numkeys, *args):
+        self.calls.append((script, numkeys, args))
+        return self.replies.pop(0)
+
+
+def test_backends_must_implement_take():
+    class Incomplete(RateLimitBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_redis_backend_runs_the_bucket_script(monkeypatch):
+    # Redis returns the wait as a string (Lua numbers would be truncated)
+    fake = FakeRedis(b"0", b"12.5")
+    monkeypatch.setattr(rate_limit, "backend", RedisBackend(fake, prefix="rl:"))
+
+    rate_limit.check_ip_rate("register", "10.0.0.1")
+    with pytest.raises(HTTPException) as exc:
+        rate_limit.check_ip_rate("register", "10.0.0.1")
+    assert exc.value.status_code == 429
+    assert exc.value.headers["Retry-After"] == "13"
+
+    script, numkeys, (key, rate, burst, _now) = fake.calls[0]
+    assert script == RedisBackend.SCRIPT and numkeys == 1
+    assert key == "rl:register:ip:10.0.0.1"
+    assert (rate, burst) == (settings.LOGIN_IP_PER_MINUTE / 60, settings.LOGIN_IP_BURST)
@@ -0,0 +1,61 @@
+import json
+
+from app import models
+from app.security import hash_password
+
+
+def _admin_headers(client, db):
+    db.add(models.User(email="lister@example.com", hashed_password=hash_password("ListPass123"), role="admin"))
+    db.commit()
+    token = client.post(
+        "/auth/login", json={"email": "lister@example.com", "password": "ListPass123"}
+    ).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _add_users(db, count):
+    # Pre-hashed once; the listing tests don't need distinct passwords
+    hashed = hash_password("Irrelevant1")
+    for i in range(count):
+        db.add(models.User(email=f"member{i}@example.com", hashed_password=hashed, is_active=i % 2 == 0))
+    db.commit()
+
+
+def test_list_users_keyset_pagination(client, db):
+    headers = _admin_headers(client, db)
+    _add_users(db, 5)
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, "role": "user"}
+        if cursor is not None:
+            params["after_id"] = cursor
+        page = client.get("/users", params=params, headers=headers).json()
+        seen += [u["email"] for u in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == [f"member{i}@example.com" for i in range(5)]
+
+    inactive = client.get("/users", params={"is_active": False}, headers=headers).json()
+    assert [u["email"] for u in inactive["items"]] == ["member1@example.com", "member3@example.com"]
+
+
+def test_export_users_streams_ndjson(client, db):
+    headers = _admin_headers(client, db)
+    _add_users(db, 3)
+
+    response = client.get("/users/export", params={"role": "user"}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["email"] for r in rows] == [f"member{i}@example.com" for i in range(3)]
+
+
+def test_listing_requires_admin(client):
+    client.post("/auth/register", json={"email": "nosy@example.com", "password": "NosyPass123"})
+    token = client.post(
+        "/auth/login", json={"email": "nosy@example.com", "password": "NosyPass123"}
+    ).json()["access_token"]
+    assert client.get("/users", headers={"Authorization": f"Bearer {token}"}).status_code == 403
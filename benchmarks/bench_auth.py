@@ -0,0 +1,239 @@
+"""
+Load and latency benchmark for the auth endpoints.
+
+Drives /auth/register, /auth/login, /auth/refresh, /users/me and /auth/logout
+either in-process (ASGI transport, no sockets) or against a real uvicorn
+server on a local port, at a fixed concurrency. Prints p50/p95/p99 latency
+and requests/s per endpoint, and can save or compare JSON baselines.
+
+    python benchmarks/bench_auth.py --mode inprocess --requests 200 --concurrency 20
+    python benchmarks/bench_auth.py --mode uvicorn --bcrypt-rounds 12 --save baseline.json
+    python benchmarks/bench_auth.py --compare baseline.json --max-regression 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# A throwaway database and settings, unless the caller provides real ones.
+# Throttling is opened up so the numbers measure the endpoints, not the limiter.
+_BENCH_DIR = tempfile.mkdtemp(prefix="auth-bench-")
+for key, value in {
+    "DATABASE_URL": f"sqlite:///{_BENCH_DIR}/bench.db",
+    "SECRET_KEY": "benchmark-secret",
+    "MAIL_USERNAME": "bench",
+    "MAIL_PASSWORD": "bench",
+    "MAIL_FROM": "bench@example.com",
+    "MAIL_SERVER": "localhost",
+    "OUTBOX_POLL_SECONDS": "0",
+    "REVOKED_PURGE_INTERVAL_SECONDS": "0",
+    "LOGIN_IP_PER_MINUTE": "100000000",
+    "LOGIN_IP_BURST": "100000000",
+    "LOGIN_EMAIL_PER_MINUTE": "100000000",
+    "LOGIN_EMAIL_BURST": "100000000",
+    "HASH_MAX_QUEUE": "100000",
+}.items():
+    os.environ.setdefault(key, value)
+
+import httpx
+
+ENDPOINTS = ["register", "login", "refresh", "me", "logout"]
+PASSWORD = "BenchPass123"
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(pct / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarise(latencies: list[float], errors: int, wall: float) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / wall, 1) if wall else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+    }
+
+
+async def run_phase(client: httpx.AsyncClient, make_request, count: int, concurrency: int) -> dict:
+    """Issue `count` requests with at most `concurrency` in flight."""
+    latencies: list[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < count:
+            i = next_index
+            next_index += 1
+            started = time.perf_counter()
+            response = await make_request(client, i)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    wall_started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarise(latencies, errors, time.perf_counter() - wall_started)
+
+
+async def run_suite(client: httpx.AsyncClient, requests: int, concurrency: int) -> dict:
+    from app.security import create_access_token
+
+    run_id = uuid.uuid4().hex[:8]
+    emails = [f"bench-{run_id}-{i}@example.com" for i in range(requests)]
+    access_tokens: list[str] = [""] * requests
+    refresh_tokens: list[str] = [""] * requests
+    results = {}
+
+    async def register(c, i):
+        return await c.post("/auth/register", json={"email": emails[i], "password": PASSWORD})
+
+    async def login(c, i):
+        response = await c.post("/auth/login", json={"email": emails[i], "password": PASSWORD})
+        if response.status_code == 200:
+            access_tokens[i] = response.json()["access_token"]
+            refresh_tokens[i] = response.cookies.get("refresh_token", "")
+        return response
+
+    async def refresh(c, i):
+        return await c.post("/auth/refresh", headers={"Cookie": f"refresh_token={refresh_tokens[i]}"})
+
+    async def me(c, i):
+        return await c.get("/users/me", headers={"Authorization": f"Bearer {access_tokens[i]}"})
+
+    async def logout(c, i):
+        # A fresh token per call: identical tokens can only be revoked once
+        token = create_access_token({"sub": emails[i], "role": "user", "jti": uuid.uuid4().hex})
+        return await c.post("/auth/logout", headers={"Authorization": f"Bearer {token}"})
+
+    for name, fn in zip(ENDPOINTS, [register, login, refresh, me, logout]):
+        results[name] = await run_phase(client, fn, requests, concurrency)
+        print(f"  {name:<9} {results[name]}", flush=True)
+    return results
+
+
+async def bench_inprocess(requests: int, concurrency: int) -> dict:
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    # ASGITransport doesn't run the lifespan, so enter it ourselves
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await run_suite(client, requests, concurrency)
+
+
+async def bench_uvicorn(requests: int, concurrency: int) -> dict:
+    import uvicorn
+    from app.main import app
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    try:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits) as client:
+            return await run_suite(client, requests, concurrency)
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+def compare(current: dict, baseline: dict, max_regression: float) -> bool:
+    """Print p95/rps deltas; return False if any p95 regressed beyond the limit."""
+    ok = True
+    print(f"\nComparison with baseline ({baseline['meta']['created_at']}):")
+    for key in ("mode", "requests", "concurrency", "bcrypt_rounds", "cpu_count"):
+        if current["meta"][key] != baseline["meta"].get(key):
+            print(f"  warning: {key} differs ({baseline['meta'].get(key)} -> {current['meta'][key]})")
+    for name, stats in current["results"].items():
+        base = baseline["results"].get(name)
+        if not base:
+            continue
+        p95_delta = (stats["p95_ms"] - base["p95_ms"]) / base["p95_ms"] if base["p95_ms"] else 0.0
+        rps_delta = (stats["rps"] - base["rps"]) / base["rps"] if base["rps"] else 0.0
+        regressed = p95_delta > max_regression
+        ok = ok and not regressed
+        marker = "REGRESSION" if regressed else "ok"
+        print(f"  {name:<9} p95 {base['p95_ms']:>8} -> {stats['p95_ms']:>8} ms ({p95_delta:+.0%})"
+              f"  rps {base['rps']:>8} -> {stats['rps']:>8} ({rps_delta:+.0%})  {marker}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--bcrypt-rounds", type=int, default=None, help="Override the bcrypt cost for this run")
+    parser.add_argument("--save", metavar="PATH", help="Write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="Compare against a saved baseline")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed p95 increase (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    if args.bcrypt_rounds:
+        # Through settings rather than this process's hashing context, so the
+        # process-pool hash workers (HASH_EXECUTOR=process) use it as well
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+
+    from app import security
+    from app.config import settings
+    if args.bcrypt_rounds and settings.PASSWORD_HASH_TARGET_MS:
+        parser.error("--bcrypt-rounds can't be combined with PASSWORD_HASH_TARGET_MS, "
+                     "which picks the cost at startup")
+    rounds = security.get_pwd_context().handler("bcrypt").default_rounds
+
+    print(f"Benchmarking ({args.mode}, {args.requests} requests/endpoint, "
+          f"concurrency {args.concurrency}, bcrypt rounds {rounds})")
+    runner = bench_inprocess if args.mode == "inprocess" else bench_uvicorn
+    results = asyncio.run(runner(args.requests, args.concurrency))
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "mode": args.mode,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "bcrypt_rounds": rounds,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(report, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
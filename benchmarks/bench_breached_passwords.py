@@ -0,0 +1,85 @@
+"""
+Lookup latency and memory for the breached-password index.
+
+Builds a synthetic index of random SHA-1 digests (or opens an existing one)
+and times lookups of present and absent hashes. Prints p50/p99 per lookup and
+the process's resident memory before and after, showing the mmap'd file is
+not loaded wholesale.
+
+    python benchmarks/bench_breached_passwords.py --records 10000000
+    python benchmarks/bench_breached_passwords.py --index /data/pwned.idx --lookups 100000
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.breached_passwords import DATA_OFFSET, RECORD_SIZE, BreachedPasswordIndex, build_index
+
+
+def rss_mb() -> float:
+    # Current RSS from /proc where available, else the peak from getrusage
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def time_lookups(index: BreachedPasswordIndex, digests: list[bytes], expected: bool) -> dict:
+    timings = []
+    for digest in digests:
+        started = time.perf_counter()
+        found = digest in index
+        timings.append(time.perf_counter() - started)
+        assert found is expected
+    timings.sort()
+    return {
+        "lookups": len(timings),
+        "p50_us": round(timings[len(timings) // 2] * 1e6, 2),
+        "p99_us": round(timings[int(len(timings) * 0.99)] * 1e6, 2),
+        "max_us": round(timings[-1] * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", help="Existing index to benchmark (default: build a synthetic one)")
+    parser.add_argument("--records", type=int, default=1_000_000, help="Size of the synthetic index")
+    parser.add_argument("--lookups", type=int, default=20_000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory(prefix="breached-bench-") as tmp:
+        path = args.index
+        if path is None:
+            path = os.path.join(tmp, "bench.idx")
+            started = time.perf_counter()
+            build_index((rng.randbytes(RECORD_SIZE) for _ in range(args.records)), path)
+            print(f"Built {args.records} records in {time.perf_counter() - started:.1f}s")
+
+        rss_before = rss_mb()
+        index = BreachedPasswordIndex(path)
+        print(f"Index: {path} ({len(index)} records, {os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+
+        # Present digests are read from random positions in the file itself
+        with open(path, "rb") as f:
+            present = []
+            for _ in range(args.lookups):
+                f.seek(DATA_OFFSET + rng.randrange(len(index)) * RECORD_SIZE)
+                present.append(f.read(RECORD_SIZE))
+        absent = [d for d in (rng.randbytes(RECORD_SIZE) for _ in range(args.lookups)) if d not in index]
+
+        print(f"  hit   {time_lookups(index, present, True)}")
+        print(f"  miss  {time_lookups(index, absent, False)}")
+        print(f"  rss   {rss_before:.1f} MB before open, {rss_mb():.1f} MB after lookups")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Cold-start benchmark: how long a fresh worker takes before it can serve.
+
+Each run starts a new interpreter (so nothing is cached in-process), then
+times `import app.main`, each lifespan phase (schema check, revocation warm
+etc., as recorded in app.main.startup_timings) and the first request.
+Prints the median and worst of each phase over several runs.
+
+    python benchmarks/bench_startup.py --runs 10
+    python benchmarks/bench_startup.py --runs 5 --json startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside each fresh interpreter and prints one JSON line of timings
+CHILD = r"""
+import asyncio, json, sys, time
+started = time.perf_counter()
+import app.main as main
+timings = {"import": time.perf_counter() - started}
+
+async def boot():
+    import httpx
+    lifespan_started = time.perf_counter()
+    async with main.app.router.lifespan_context(main.app):
+        timings["lifespan"] = time.perf_counter() - lifespan_started
+        request_started = time.perf_counter()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            (await client.get("/")).raise_for_status()
+        timings["first_request"] = time.perf_counter() - request_started
+
+asyncio.run(boot())
+timings.update({f"lifespan.{k}": v for k, v in main.startup_timings.items()})
+print(json.dumps(timings))
+"""
+
+
+def run_once(env: dict) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", metavar="PATH", help="Also write the raw timings here")
+    args = parser.parse_args()
+
+    # A throwaway database and settings, unless the caller provides real ones.
+    # Background workers are off: they start after the lifespan anyway.
+    bench_dir = tempfile.mkdtemp(prefix="auth-startup-")
+    env = dict(os.environ)
+    for key, value in {
+        "DATABASE_URL": f"sqlite:///{bench_dir}/startup.db",
+        "SECRET_KEY": "benchmark-secret",
+        "MAIL_USERNAME": "bench",
+        "MAIL_PASSWORD": "bench",
+        "MAIL_FROM": "bench@example.com",
+        "MAIL_SERVER": "localhost",
+        "OUTBOX_POLL_SECONDS": "0",
+        "REVOKED_PURGE_INTERVAL_SECONDS": "0",
+    }.items():
+        env.setdefault(key, value)
+
+    # The first boot creates the schema; measure the warm-database case after it
+    first = run_once(env)
+    print(f"First boot (creates schema): schema_check {first.get('lifespan.schema_check', 0) * 1000:.1f} ms")
+
+    runs = [run_once(env) for _ in range(args.runs)]
+    print(f"\nStartup over {args.runs} runs (ms):")
+    print(f"  {'phase':<28} {'median':>9} {'max':>9}")
+    for phase in runs[0]:
+        values = [run[phase] * 1000 for run in runs if phase in run]
+        print(f"  {phase:<28} {statistics.median(values):>9.1f} {max(values):>9.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"first_boot": first, "runs": runs}, f, indent=2)
+        print(f"Saved timings to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import argparse
+import gzip
+import sys
+import os
+import time
+
+# Add the project root to the python path so we can import 'app' modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.breached_passwords import BreachedPasswordIndex, build_index, parse_digest
+
+def read_digests(paths: list[str], plaintext: bool, stats: dict):
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                digest = parse_digest(line, plaintext)
+                if digest is None:
+                    stats["skipped"] += 1
+                    continue
+                yield digest
+
+def build(paths: list[str], out_path: str, plaintext: bool, chunk_records: int):
+    stats = {"skipped": 0}
+    started = time.perf_counter()
+    try:
+        total = build_index(read_digests(paths, plaintext, stats), out_path, chunk_records)
+    except Exception as e:
+        print(f"❌ Error building index: {e}")
+        sys.exit(1)
+
+    index = BreachedPasswordIndex(out_path)
+    size_mb = os.path.getsize(out_path) / 1024 / 1024
+    print(f"✅ Wrote {len(index)} unique hashes to {out_path} ({size_mb:.1f} MB) "
+          f"in {time.perf_counter() - started:.1f}s, skipped {stats['skipped']} lines")
+    index.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert a breached-password corpus into the index read by BREACHED_PASSWORDS_PATH."
+    )
+    parser.add_argument("sources", nargs="+", help="Corpus files (.txt or .gz), e.g. the HIBP SHA-1 dump")
+    parser.add_argument("--out", required=True, help="Index file to write")
+    parser.add_argument("--plaintext", action="store_true", help="Lines are passwords, not SHA-1 hashes")
+    parser.add_argument("--chunk-records", type=int, default=5_000_000,
+                        help="Hashes sorted in memory per run (20 bytes each, plus overhead)")
+    args = parser.parse_args()
+    build(args.sources, args.out, args.plaintext, args.chunk_records)
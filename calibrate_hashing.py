@@ -0,0 +1,26 @@
+import argparse
+import sys
+import os
+
+# Add the project root to the python path so we can import 'app' modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.config import settings
+from app.security import calibrate_argon2_time_cost, calibrate_bcrypt_rounds
+
+def calibrate(target_ms: int):
+    print(f"⏱️  Measuring password hashing cost for ~{target_ms}ms per hash...")
+    rounds = calibrate_bcrypt_rounds(target_ms)
+    print(f"✅ BCRYPT_ROUNDS={rounds}")
+
+    if "argon2" in settings.PASSWORD_HASH_SCHEMES:
+        time_cost = calibrate_argon2_time_cost(target_ms)
+        print(f"✅ ARGON2_TIME_COST={time_cost}  (ARGON2_MEMORY_COST={settings.ARGON2_MEMORY_COST})")
+
+    print("   Add these to .env. Existing hashes are upgraded on each user's next login.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find the hash cost that matches a target latency.")
+    parser.add_argument("--target-ms", type=int, default=settings.PASSWORD_HASH_TARGET_MS or 250)
+    args = parser.parse_args()
+    calibrate(args.target_ms)
@@ -1,16 +1,30 @@
+import re
+import time
+from contextlib import contextmanager
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 # Fix 1: Import app from main
 from app.main import app
 
-# Fix 2: Import Base, engine from database
-from app.database import Base, engine
+# Fix 2: Import Base from database (the test engine is created below)
+from app import database
+from app.database import Base
 
 # Fix 3: Import get_db from dependencies (not database!)
-from app.dependencies import get_db
+from app.dependencies import get_async_db, get_db, get_read_db
+
+from app.config import settings
+from app.services import rate_limit
+from app.services.audit import audit_log
+from app.services.claims_cache import claims_cache
+from app.services.revocation import revocation_cache
+from app.services.user_cache import user_cache
 
 # Create a temporary in-memory SQLite database for testing
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -20,6 +34,11 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The async routes reach the same file through aiosqlite. NullPool: each
+# TestClient runs its own event loop, so no connection outlives one
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+AsyncTestingSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 @pytest.fixture(scope="function")
 def db():
     # Create the tables
@@ -33,7 +52,12 @@ def db():
         Base.metadata.drop_all(bind=engine)
 
 @pytest.fixture(scope="function")
-def client(db):
+def session_factory(db):
+    # For code that opens its own sessions (background workers) instead of using get_db
+    return TestingSessionLocal
+
+@pytest.fixture(scope="function")
+def client(db, monkeypatch, request):
     # Override the get_db dependency to use the test database
     def override_get_db():
         try:
@@ -41,9 +65,87 @@ def client(db):
         finally:
             pass
     
+    async def override_get_async_db():
+        async with AsyncTestingSessionLocal() as session:
+            yield session
+
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    # Work the lifespan starts outside a request (cache warm-up, the audit
+    # flush at shutdown) opens its own sessions; keep that on the test database too
+    monkeypatch.setattr(database, "get_sessionmaker", lambda: TestingSessionLocal)
+    if "query_budget" in request.fixturenames:
+        # The audit flusher, outbox poller and revocation sweeper share these
+        # engines; left running they would add statements to a budget at random
+        monkeypatch.setattr(settings, "AUDIT_FLUSH_SECONDS", 0)
+        monkeypatch.setattr(settings, "OUTBOX_POLL_SECONDS", 0)
+        monkeypatch.setattr(settings, "REVOKED_PURGE_INTERVAL_SECONDS", 0)
+    # In-process caches outlive the per-test database, so start each test clean
+    revocation_cache.clear()
+    user_cache.clear()
+    claims_cache.clear()
+    audit_log.clear()
+    rate_limit.backend.clear()
     # Create a TestClient (acts like a browser, but in code)
     with TestClient(app) as test_client:
         yield test_client
     # Clean up override after test
-    app.dependency_overrides.clear()
\ No newline at end of file
+    app.dependency_overrides.clear()
+
+
+class QueryBudget:
+    """
+    Records the SQL statements and wall time of a block of test code and
+    fails, listing every statement, when either goes over budget:
+
+        with query_budget(max_queries=1, max_seconds=0.2, label="GET /users/me"):
+            client.get("/users/me", headers=headers)
+    """
+
+    def __init__(self, *binds):
+        self.binds = binds
+        self.statements: list[tuple[str, object]] = []
+        self.elapsed = 0.0
+
+    @contextmanager
+    def __call__(self, max_queries: int | None = None, max_seconds: float | None = None, label: str = "block"):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        for bind in self.binds:
+            event.listen(bind, "before_cursor_execute", record)
+        started = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.elapsed = time.perf_counter() - started
+            for bind in self.binds:
+                event.remove(bind, "before_cursor_execute", record)
+            self.statements = statements
+
+        problems = []
+        if max_queries is not None and len(statements) > max_queries:
+            problems.append(f"{len(statements)} SQL statements (budget {max_queries})")
+        if max_seconds is not None and self.elapsed > max_seconds:
+            problems.append(f"{self.elapsed * 1000:.1f} ms (budget {max_seconds * 1000:.0f} ms)")
+        if problems:
+            pytest.fail(f"{label} over budget: {', '.join(problems)}\n{self.dump()}", pytrace=False)
+
+    def dump(self) -> str:
+        lines = []
+        for i, (statement, parameters) in enumerate(self.statements, 1):
+            sql = re.sub(r"\s+", " ", statement).strip()
+            lines.append(f"  {i}. {sql}")
+            if parameters:
+                lines.append(f"     params: {str(parameters)[:200]}")
+        return "\n".join(lines) or "  (no statements)"
+
+
+@pytest.fixture(scope="function")
+def query_budget(db):
+    # Counts every statement on the test engines; the client fixture keeps
+    # the background loops stopped when a test asks for a budget
+    return QueryBudget(engine, async_engine.sync_engine)
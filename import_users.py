@@ -0,0 +1,160 @@
+import argparse
+import csv
+import json
+import re
+import sys
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from email_validator import EmailNotValidError, validate_email
+
+# Add the project root to the python path so we can import 'app' modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import SessionLocal, engine
+from app.models import User
+from app.security import hash_password
+
+# Existing bcrypt hashes ($2a$/$2b$/$2y$) are imported as-is
+BCRYPT_HASH = re.compile(r"^\$2[aby]\$\d{2}\$[./A-Za-z0-9]{53}$")
+
+def read_rows(path: str, fmt: str):
+    """Stream dict rows from a CSV (with header) or JSONL file."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+def batches(rows, size: int):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+def _as_bool(value, default: bool = True) -> bool:
+    # A blank cell (CSV) or null (JSONL) means "not given", not False
+    if value is None or str(value).strip() == "":
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() not in ("0", "false", "no")
+
+def prepare_batch(rows, pool: ProcessPoolExecutor, workers: int, default_role: str):
+    """
+    Normalise rows and start hashing plaintext passwords on the pool.
+
+    Returns the rows to insert, the pending hash results (resolved later,
+    so hashing overlaps with inserting the previous batch) and the number
+    of rows that were rejected.
+    """
+    by_email, rejected = {}, 0
+    for row in rows:
+        hashed = row.get("hashed_password") or ""
+        password = row.get("password") or ""
+        try:
+            # Normalise the same way the API's EmailStr does, so logins match
+            email = validate_email((row.get("email") or "").strip(), check_deliverability=False).normalized
+        except EmailNotValidError:
+            email = None
+        if email is None or not (BCRYPT_HASH.match(hashed) or password):
+            rejected += 1
+            continue
+
+        record = {
+            "email": email,
+            "hashed_password": hashed if BCRYPT_HASH.match(hashed) else None,
+            "role": row.get("role") or default_role,
+            "is_active": _as_bool(row.get("is_active")),
+        }
+        # A repeated email within one batch keeps its last row
+        by_email[email] = (record, password)
+
+    records = [record for record, _ in by_email.values()]
+    plaintext = [(record, password) for record, password in by_email.values() if record["hashed_password"] is None]
+    chunksize = max(len(plaintext) // (workers * 4), 1)
+    hashes = pool.map(hash_password, [p for _, p in plaintext], chunksize=chunksize)
+    return records, [r for r, _ in plaintext], hashes, rejected
+
+def insert_batch(db, records, on_conflict: str) -> int:
+    """Multi-row INSERT with conflict handling on users.email."""
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif engine.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"Bulk import is not supported on {engine.dialect.name}")
+
+    stmt = insert(User).values(records)
+    if on_conflict == "update":
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[User.email],
+            set_={
+                "hashed_password": stmt.excluded.hashed_password,
+                "role": stmt.excluded.role,
+                "is_active": stmt.excluded.is_active,
+            },
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[User.email])
+
+    result = db.execute(stmt)
+    db.commit()
+    return result.rowcount
+
+def import_users(path, fmt, batch_size, workers, on_conflict, default_role):
+    db = SessionLocal()
+    started = time.perf_counter()
+    read = written = rejected = 0
+
+    def flush(pending):
+        nonlocal written
+        records, to_hash, hashes, _ = pending
+        for record, hashed in zip(to_hash, hashes):
+            record["hashed_password"] = hashed
+        if records:
+            written += insert_batch(db, records, on_conflict)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = None
+            for rows in batches(read_rows(path, fmt), batch_size):
+                # Start hashing this batch before inserting the previous one
+                current = prepare_batch(rows, pool, workers, default_role)
+                read += len(rows)
+                rejected += current[3]
+                if pending is not None:
+                    flush(pending)
+                pending = current
+
+                elapsed = time.perf_counter() - started
+                print(f"   {read} rows read, {written} written, {rejected} rejected "
+                      f"({read / elapsed:,.0f} rows/s)", flush=True)
+            if pending is not None:
+                flush(pending)
+
+        elapsed = time.perf_counter() - started
+        skipped = read - written - rejected
+        print(f"✅ Imported {written} users in {elapsed:.1f}s ({read / max(elapsed, 1e-9):,.0f} rows/s)")
+        print(f"   Rejected: {rejected}  Skipped (duplicate or existing email): {skipped}")
+    except Exception as e:
+        print(f"❌ Error importing users: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import users from CSV or JSONL.")
+    parser.add_argument("path", help="CSV (with header) or JSONL file with email, password or hashed_password, role, is_active")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes for hashing plaintext passwords")
+    parser.add_argument("--on-conflict", choices=["skip", "update"], default="skip")
+    parser.add_argument("--default-role", default="user")
+    args = parser.parse_args()
+
+    fmt = args.format or ("jsonl" if args.path.endswith((".jsonl", ".ndjson")) else "csv")
+    import_users(args.path, fmt, args.batch_size, args.workers, args.on_conflict, args.default_role)
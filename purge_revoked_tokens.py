@@ -0,0 +1,39 @@
+import argparse
+import sys
+import os
+
+# Add the project root to the python path so we can import 'app' modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.config import settings
+from app.database import SessionLocal
+from app.services.revocation import purge_expired_revocations, revocation_table_stats
+from app.services.sessions import purge_expired_sessions
+
+def purge(batch_size: int, report_only: bool):
+    db = SessionLocal()
+    try:
+        before = revocation_table_stats(db)
+        print(f"📊 revoked_tokens: {before['rows']} rows, {before['expired_rows']} expired")
+
+        if report_only:
+            return
+
+        deleted = purge_expired_revocations(db, batch_size)
+        stats = revocation_table_stats(db)["purge"]
+        print(f"✅ Purged {deleted} rows in {stats['last_duration_seconds']}s "
+              f"({stats['last_rows_per_second']} rows/s)")
+        sessions = purge_expired_sessions(db, batch_size)
+        print(f"✅ Purged {sessions} expired refresh sessions")
+    except Exception as e:
+        print(f"❌ Error purging revoked tokens: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete expired rows from revoked_tokens.")
+    parser.add_argument("--batch-size", type=int, default=settings.REVOKED_PURGE_BATCH_SIZE)
+    parser.add_argument("--report", action="store_true", help="Only print table size")
+    args = parser.parse_args()
+    purge(args.batch_size, args.report)
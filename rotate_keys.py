@@ -0,0 +1,30 @@
+import argparse
+import sys
+import os
+
+# Add the project root to the python path so we can import 'app' modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.config import settings
+from app.keyring import get_keyring
+
+def rotate_signing_key(now: bool = False):
+    if settings.ALGORITHM.startswith("HS"):
+        print(f"⚠️  ALGORITHM is {settings.ALGORITHM}; key rotation only applies to RS256/ES256.")
+        return
+
+    keyring = get_keyring()
+    kid = keyring.rotate(activate_in=0 if now else None)
+    if now:
+        print(f"✅ New signing key (signing now): {kid}")
+    else:
+        delay = settings.JWKS_CACHE_MAX_AGE + settings.JWT_KEYRING_RELOAD_SECONDS
+        print(f"✅ New signing key (published now, signing in {delay}s): {kid}")
+    kept = [key["kid"] for key in keyring.jwks()["keys"]]
+    print(f"   Verification keys kept: {', '.join(kept)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rotate the JWT signing key")
+    parser.add_argument("--now", action="store_true",
+                        help="sign with the new key at once (leaked key); verifiers with a cached JWKS reject new tokens until they refetch")
+    rotate_signing_key(now=parser.parse_args().now)